@@ -0,0 +1,61 @@
+"""Measure the per-row cost of turning csv rows into DataEntry objects.
+
+Rows are drawn from a pool of synthetic statement lines spanning ten years, so
+memory stays flat even for a million rows while dates repeat the way they do in
+real exports.
+
+    python benchmarks/bench_entry.py --rows 1000000
+"""
+import argparse
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from locale import LC_ALL, atof, setlocale
+from typing import Callable, Iterable
+
+from synthetic import pooled_transactions
+
+from banksheets.entry import DataEntry
+
+
+@dataclass(order=True, frozen=True)
+class LegacyEntry:
+    """DataEntry as it was before the fast construction path."""
+
+    date: datetime
+    amount: float
+    description: str
+    extra_desc: str = ""
+
+    def __post_init__(self):
+        setlocale(LC_ALL, "")
+        object.__setattr__(self, "date", datetime.strptime(self.date, "%m/%d/%Y"))
+        object.__setattr__(self, "amount", atof(self.amount))
+
+
+def _time(count: int, stage: Callable[[Iterable], Iterable]) -> float:
+    rows = pooled_transactions(count)
+    start = time.perf_counter()
+    deque(stage(rows), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    stages = {
+        "LegacyEntry(**row)": lambda rows: (LegacyEntry(**row) for row in rows),
+        "DataEntry(**row)": lambda rows: (DataEntry(**row) for row in rows),
+        "DataEntry.from_rows": DataEntry.from_rows,
+    }
+    print(f"{args.rows} rows")
+    for name, stage in stages.items():
+        elapsed = _time(args.rows, stage)
+        print(f"{name:>20}: {elapsed:7.2f}s {elapsed / args.rows * 1e6:7.2f}us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Time header detection on statements with long summary preambles.
+
+Every preamble line is a summary row whose first cell is text, some with a date
+inside, the way bank exports start. The previous dateutil-per-line detection is
+timed alongside SkipAheadDictReader for comparison.
+
+    python benchmarks/bench_headers.py --preamble 500 --files 200
+"""
+import argparse
+import time
+from io import StringIO
+
+from dateutil.parser import parse
+from synthetic import synthetic_statement
+
+from banksheets.formats import FormatRegistry
+from banksheets.transaction_reader import SkipAheadDictReader
+
+
+def _legacy_detect(file: StringIO) -> list[str]:
+    # The per-line dateutil probe SkipAheadDictReader used to run.
+    prev_row_segments = []
+    for line in file:
+        split_line = line.split(",")
+        try:
+            parse(split_line[0].strip('"'))
+            return prev_row_segments
+        except ValueError:
+            prev_row_segments = split_line
+    return prev_row_segments
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preamble", type=int, default=500)
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+
+    bank_format = next(
+        bank_format
+        for bank_format in FormatRegistry.builtin()
+        if bank_format.name == "bofa_bank"
+    )
+    text = synthetic_statement(bank_format, 1, preamble=args.preamble)
+    detectors = {
+        "dateutil per line": _legacy_detect,
+        "SkipAheadDictReader": SkipAheadDictReader,
+    }
+    print(f"{args.files} files with {args.preamble * 2} preamble lines")
+    for name, detect in detectors.items():
+        start = time.perf_counter()
+        for _ in range(args.files):
+            detect(StringIO(text))
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20}: {elapsed:7.3f}s {elapsed / args.files * 1e3:8.3f}ms/file")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compare the insert workflow with per-step commits against one IngestSession.
+
+Runs staging, duplicate lookup and preserve on a fresh database file for each
+configuration and reports rows per second.
+
+    python benchmarks/bench_session.py --rows 200000 --batch-size 1000
+"""
+import argparse
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from synthetic import pooled_transactions
+
+from banksheets.entry import DataEntry
+from banksheets.sql_commands import (
+    IngestSession,
+    clear_potential,
+    create_sql_connection,
+    get_duplicate_groups,
+    insert_entries,
+    preserve_potential,
+)
+
+
+def _run(path: Path, rows: int, batch_size: int, pragmas: dict | None) -> float:
+    entries = DataEntry.from_rows(pooled_transactions(rows))
+    start = time.perf_counter()
+    with create_sql_connection(path) as db:
+        session = nullcontext() if pragmas is None else IngestSession(db, **pragmas)
+        with session:
+            insert_entries(entries, db, batch_size)
+            get_duplicate_groups(db)
+            preserve_potential(db)
+            clear_potential(db)
+    db.close()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    configurations = {
+        "per-step commits": None,
+        "session": {},
+        "session wal/normal": {"journal_mode": "wal", "synchronous": "normal"},
+        "session wal/normal/cache/mmap": {
+            "journal_mode": "wal",
+            "synchronous": "normal",
+            "cache_size": -64_000,
+            "mmap_size": 256 * 1024 * 1024,
+        },
+    }
+    print(f"{args.rows} rows, batch size {args.batch_size}")
+    with tempfile.TemporaryDirectory() as folder:
+        for number, (name, pragmas) in enumerate(configurations.items()):
+            path = Path(folder) / f"bench_{number}.db"
+            elapsed = _run(path, args.rows, args.batch_size, pragmas)
+            print(f"{name:>30}: {elapsed:6.2f}s {args.rows / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
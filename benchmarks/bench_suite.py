@@ -0,0 +1,191 @@
+"""Measure throughput of each stage of the ingest and report paths.
+
+Synthetic statements are written for every bank format in the registry, then
+read, converted, staged, checked for duplicates, saved and reported on a fresh
+database file. Each stage prints rows per second and the peak RSS of the
+process so far. --memory also traces the peak Python allocation inside each
+stage, which slows the stages down. --json writes the results for comparing
+runs.
+
+    python benchmarks/bench_suite.py --rows 200000 --files 8 --duplicate-rate 0.05
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+from synthetic import write_statements
+
+from banksheets.formats import FormatRegistry
+from banksheets.sql_commands import (
+    clear_potential,
+    create_sql_connection,
+    get_potential_duplicates,
+    insert_entries,
+    iter_duplicate_groups,
+    iter_search,
+    iter_summary,
+    preserve_potential,
+)
+from banksheets.transaction_reader import SkipAheadDictReader
+from banksheets.ui.common import convert_csv_data_to_dataentry, iter_data
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StageResult(NamedTuple):
+    stage: str
+    rows: int
+    seconds: float
+    rows_per_second: float
+    peak_rss_mib: Optional[float]
+    traced_peak_mib: Optional[float]
+
+
+def _peak_rss_mib() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _measure(name: str, stage: Callable[[], int], memory: bool) -> StageResult:
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    rows = stage()
+    elapsed = time.perf_counter() - start
+    traced = None
+    if memory:
+        traced = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    rate = rows / elapsed if elapsed else float("inf")
+    return StageResult(name, rows, elapsed, rate, _peak_rss_mib(), traced)
+
+
+def _read_dicts(paths: list[Path]) -> list[dict[str, str]]:
+    rows = []
+    for path in paths:
+        with open(path, newline="") as fp:
+            rows.extend(SkipAheadDictReader(fp))
+    return rows
+
+
+def run(args: argparse.Namespace, folder: Path) -> list[StageResult]:
+    registry = FormatRegistry.builtin()
+    for path in args.formats:
+        registry.load(Path(path))
+    statements = folder / "statements"
+    statements.mkdir()
+    paths = write_statements(
+        statements,
+        args.rows,
+        args.files,
+        args.duplicate_rate,
+        args.descriptions,
+        registry,
+        args.seed,
+    )
+
+    state = {}
+
+    def read() -> int:
+        state["dicts"] = _read_dicts(paths)
+        return len(state["dicts"])
+
+    def convert() -> int:
+        return len(convert_csv_data_to_dataentry(state.pop("dicts")))
+
+    def parse() -> int:
+        state["entries"] = list(iter_data(statements, args.jobs, registry))
+        return len(state["entries"])
+
+    db = create_sql_connection(folder / "bench.db")
+
+    def insert() -> int:
+        return insert_entries(state.pop("entries"), db, args.batch_size)
+
+    def duplicates() -> int:
+        get_potential_duplicates(db)
+        for _ in iter_duplicate_groups(db, args.batch_size):
+            pass
+        return db.execute("SELECT COUNT(*) FROM potential_transaction;").fetchone()[0]
+
+    def preserve() -> int:
+        preserve_potential(db)
+        clear_potential(db)
+        return db.execute("SELECT COUNT(*) FROM bank_transaction;").fetchone()[0]
+
+    def search() -> int:
+        return sum(1 for _ in iter_search(db, None, None, None, args.batch_size))
+
+    def summary() -> int:
+        return sum(
+            1 for _ in iter_summary(db, "alias", None, None, None, args.batch_size)
+        )
+
+    stages = {
+        "SkipAheadDictReader": read,
+        "convert_csv_data_to_dataentry": convert,
+        "iter_data": parse,
+        "insert_entries": insert,
+        "duplicates": duplicates,
+        "preserve_potential": preserve,
+        "iter_search": search,
+        "iter_summary": summary,
+    }
+    try:
+        return [_measure(name, stage, args.memory) for name, stage in stages.items()]
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--descriptions", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--formats", action="append", default=[], help="extra bank format file"
+    )
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--json", type=Path, help="write the results here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        results = run(args, Path(folder))
+
+    print(
+        f"{args.rows} rows in {args.files} files, {args.descriptions} descriptions,"
+        f" {args.duplicate_rate:.0%} duplicates"
+    )
+    for result in results:
+        line = (
+            f"{result.stage:>30}: {result.seconds:7.2f}s"
+            f" {result.rows_per_second:10.0f} rows/s"
+        )
+        if result.peak_rss_mib is not None:
+            line += f" {result.peak_rss_mib:8.1f}MiB rss"
+        if result.traced_peak_mib is not None:
+            line += f" {result.traced_peak_mib:8.1f}MiB traced"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump([result._asdict() for result in results], fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
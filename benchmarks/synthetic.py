@@ -0,0 +1,124 @@
+"""Synthetic bank statements for the benchmarks.
+
+Statements are laid out by a BankFormat, so any format in the registry,
+built-in or loaded from a file, can be generated. Rows are reproducible for a
+given seed.
+"""
+import csv
+import random
+from datetime import date, timedelta
+from io import StringIO
+from itertools import cycle, islice
+from pathlib import Path
+from typing import Iterator, Optional
+
+from banksheets.formats import BankFormat, FormatRegistry
+
+_START = date(2014, 1, 1)
+
+
+def synthetic_transactions(
+    rows: int, duplicate_rate: float = 0.0, descriptions: int = 2000, seed: int = 0
+) -> Iterator[dict[str, str]]:
+    """Yield transactions keyed by banksheets.formats.FIELDS.
+
+    Args:
+        rows - the number of transactions
+        duplicate_rate - the share of rows that repeat an earlier row exactly
+        descriptions - the number of distinct descriptions to draw from
+        seed - seed for the random generator
+    """
+    rng = random.Random(seed)
+    recent: list[dict[str, str]] = []
+    for _ in range(rows):
+        if recent and rng.random() < duplicate_rate:
+            yield rng.choice(recent)
+            continue
+        number = rng.randrange(descriptions)
+        row = {
+            "date": (_START + timedelta(days=rng.randrange(3650))).strftime("%m/%d/%Y"),
+            "amount": f"{rng.uniform(-500, 500):.2f}",
+            "description": f"Company {number}",
+            "extra_desc": f"City{number % 50}, Street {number % 7}",
+        }
+        recent.append(row)
+        if len(recent) > 1000:
+            recent.pop(0)
+        yield row
+
+
+def pooled_transactions(
+    rows: int, seed: int = 0, pool_size: int = 50_000
+) -> Iterator[dict[str, str]]:
+    """Yield rows transactions cycling through a pool of at most pool_size, so
+    memory stays flat and generating them costs next to nothing while they're
+    timed.
+    """
+    pool = list(synthetic_transactions(min(rows, pool_size), seed=seed))
+    return islice(cycle(pool), rows)
+
+
+def synthetic_statement(
+    bank_format: BankFormat,
+    rows: int,
+    duplicate_rate: float = 0.0,
+    descriptions: int = 2000,
+    seed: int = 0,
+    preamble: int = 5,
+) -> str:
+    """A statement in bank_format with preamble pairs of summary lines before the
+    header, the way bank exports start. The first cell of every summary line is
+    text, one of each pair has a date inside.
+    """
+    out = StringIO()
+    out.write("Description,,Summary Amt.\n")
+    for number in range(preamble):
+        out.write(f'"Balance as of {number % 12 + 1:02}/01/2023",,"{number}.00"\n')
+        out.write(f'"Total credits {number}",,"123.13"\n')
+    out.write("\n")
+    out.write(",".join(bank_format.headers) + "\n")
+
+    by_header = {header: key for key, header in bank_format.columns.items()}
+    writer = csv.writer(out, lineterminator="\n")
+    for number, transaction in enumerate(
+        synthetic_transactions(rows, duplicate_rate, descriptions, seed)
+    ):
+        writer.writerow(
+            [
+                transaction[by_header[header]] if header in by_header else str(number)
+                for header in bank_format.headers
+            ]
+        )
+    return out.getvalue()
+
+
+def write_statements(
+    folder: Path,
+    rows: int,
+    files: int = 1,
+    duplicate_rate: float = 0.0,
+    descriptions: int = 2000,
+    registry: Optional[FormatRegistry] = None,
+    seed: int = 0,
+) -> list[Path]:
+    """Write files statements into folder, rows split evenly between them and
+    the formats of registry taking turns.
+
+    Returns:
+        The statement paths
+    """
+    bank_formats = list(registry or FormatRegistry.builtin())
+    paths = []
+    for number in range(files):
+        bank_format = bank_formats[number % len(bank_formats)]
+        path = Path(folder) / f"{number:04}_{bank_format.name}.csv"
+        text = synthetic_statement(
+            bank_format,
+            rows // files + (number < rows % files),
+            duplicate_rate,
+            descriptions,
+            seed + number,
+        )
+        path.write_text(text)
+        paths.append(path)
+    return paths
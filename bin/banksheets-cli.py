@@ -1,24 +1,46 @@
+from pathlib import Path
+
 import click
+from click.core import ParameterSource
 
+from banksheets.aliases import AliasRules, InvalidAliasRule
+from banksheets.formats import FormatRegistry, InvalidBankFormat
+from banksheets.profiling import ENV_VAR, enable_profiling
 from banksheets.sql_commands import (
+    DEFAULT_BATCH_SIZE,
+    DUPLICATE_POLICIES,
+    IngestSession,
+    InvalidMatchQuery,
+    apply_alias_rules,
     clear_potential,
     create_sql_connection,
     get_description_id_by_name,
     get_description_id_by_name_like,
     get_descriptions_missing_alias,
+    get_duplicate_groups,
     insert_alias,
-    insert_descriptions,
-    insert_potential_transactions,
+    insert_entries,
+    iter_search,
+    iter_summary,
     preserve_potential,
+    record_source_files,
     remove_potential,
     replace_alias,
-    search,
+    resolve_duplicates,
 )
 from banksheets.ui.common import (
     check_and_convert_source,
     convert_output,
-    get_data,
-    get_duplicate_groups,
+    iter_sources,
+    load_formats,
+    plan_sources,
+)
+from banksheets.watch import Watcher
+from banksheets.writers import (
+    SEARCH_COLUMNS,
+    WRITERS,
+    summary_columns,
+    write_report,
 )
 
 
@@ -30,15 +52,30 @@ def _check_source(path: str):
         raise click.BadArgumentUsage(f"{e}")
 
 
+def _load_formats(paths) -> FormatRegistry:
+    try:
+        return load_formats(paths)
+    except (ValueError, InvalidBankFormat) as e:
+        raise click.BadParameter(f"{e}", param_hint="--formats")
+
+
+def _load_alias_rules(path, param_hint: str) -> AliasRules:
+    try:
+        return AliasRules.from_file(path)
+    except (ValueError, InvalidAliasRule) as e:
+        raise click.BadParameter(f"{e}", param_hint=param_hint)
+
+
 def _query_user(db) -> None:
     to_delete_list = []
+    # Read every group up front so no cursor holds a lock while prompting
     for group in get_duplicate_groups(db):
-        entry_count = len(group[0])
+        entry_count = group.staged_count
         is_done = False
         while not is_done:
             val = input(
-                f"Duplicated input:\n{group[2]}."
-                f"\nAlready present in db: {group[1]}"
+                f"Duplicated input:\n{group.details}."
+                f"\nAlready present in db: {group.saved_count}"
                 f"\nInput number of new copies to keep (max: {entry_count}):"
             )
             num_to_keep = -1
@@ -48,7 +85,7 @@ def _query_user(db) -> None:
                 print(f"{val} is not a number")
             if 0 <= num_to_keep <= entry_count:
                 num_to_keep = entry_count - num_to_keep
-                to_delete_list.extend(group[0][:num_to_keep])
+                to_delete_list.extend(group.ids[:num_to_keep])
                 is_done = True
             else:
                 print(f"{num_to_keep} is not in range")
@@ -56,20 +93,6 @@ def _query_user(db) -> None:
     remove_potential(db, to_delete_list)
 
 
-def _keep_duplicates(db) -> None:
-    to_delete_list = []
-    for group in get_duplicate_groups(db):
-        entry_count = len(group[0])
-        db_count = group[1]
-
-        num_to_keep = 0 if db_count > 0 else 1
-        if 0 <= num_to_keep <= entry_count:
-            num_to_keep = entry_count - num_to_keep
-            to_delete_list.extend(group[0][:num_to_keep])
-
-    remove_potential(db, to_delete_list)
-
-
 def _query_list_of_missing_descriptions(db) -> None:
     for item in get_descriptions_missing_alias(db):
         print(item[0])
@@ -96,28 +119,150 @@ def cli():
     prompt="Output database",
     help="Specify the output database location (directory or file)",
 )
+@click.option(
+    "--duplicates",
+    type=click.Choice(["prompt", *DUPLICATE_POLICIES]),
+    default="prompt",
+    show_default=True,
+    help=(
+        "How to handle possible duplicates: ask about each one, keep them all, keep"
+        " one copy, keep the larger of the saved and imported counts, or keep none"
+        " of those already in the database."
+    ),
+)
 @click.option(
     "--skip-duplicates",
     is_flag=True,
+    help="Same as --duplicates keep-one.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of transactions held in memory before writing to the database.",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes used to parse the CSV files of a source directory.",
+)
+@click.option(
+    "--journal-mode",
+    type=click.Choice(["delete", "truncate", "persist", "memory", "wal", "off"]),
+    help="SQLite journal mode for the database, e.g. wal.",
+)
+@click.option(
+    "--synchronous",
+    type=click.Choice(["off", "normal", "full", "extra"]),
+    help="SQLite synchronous setting used during the insert.",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    help="SQLite page cache size, pages if positive or KiB if negative.",
+)
+@click.option(
+    "--mmap-size",
+    type=click.IntRange(min=0),
+    help="Bytes of the database SQLite may memory map.",
+)
+@click.option(
+    "--staging",
+    type=click.Choice(["disk", "memory"]),
+    default="memory",
+    show_default=True,
+    help="Where transactions wait while duplicates are checked.",
+)
+@click.option(
+    "--formats",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON or TOML file describing extra bank CSV formats. Can be repeated.",
+)
+@click.option(
+    "--alias-rules",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON or TOML alias rules file applied to new descriptions.",
+)
+@click.option(
+    "--profile",
+    is_flag=False,
+    flag_value="-",
+    envvar=ENV_VAR,
+    type=click.Path(dir_okay=False, allow_dash=True),
+    help=(
+        "Write per stage timings, row counts and SQL statement timings as JSON to"
+        " this file, or stderr if no file is given."
+    ),
+)
+@click.option(
+    "--reimport",
+    is_flag=True,
     help=(
-        "Don't prompt for possible duplicates. Instead ensure there is at least one"
-        " in the database."
+        "Read every file from the start, even ones imported before. Files that"
+        " couldn't be parsed are always read again."
     ),
 )
-def insert(source, output, skip_duplicates):
+def insert(
+    source,
+    output,
+    duplicates,
+    skip_duplicates,
+    batch_size,
+    jobs,
+    journal_mode,
+    synchronous,
+    cache_size,
+    mmap_size,
+    staging,
+    formats,
+    alias_rules,
+    profile,
+    reimport,
+):
     """Insert entries"""
+    if skip_duplicates:
+        given = click.get_current_context().get_parameter_source("duplicates")
+        if given is not ParameterSource.DEFAULT and duplicates != "keep-one":
+            raise click.UsageError(
+                "--skip-duplicates is the same as --duplicates keep-one, it can't be"
+                f" combined with --duplicates {duplicates}."
+            )
+        duplicates = "keep-one"
+    profiler = None if profile is None else enable_profiling()
     input_src = _check_source(source)
     output_src = convert_output(output)
-    transaction_data = get_data(input_src)
+    registry = _load_formats(formats)
+    rules = None
+    if alias_rules is not None:
+        rules = _load_alias_rules(alias_rules, "--alias-rules")
     with create_sql_connection(output_src) as db:
-        insert_descriptions(transaction_data, db)
-        insert_potential_transactions(transaction_data, db)
-        if skip_duplicates:
-            _keep_duplicates(db)
-        else:
-            _query_user(db)
-        preserve_potential(db)
-        clear_potential(db)
+        sources = plan_sources(input_src, db, reimport)
+        parsed = []
+        transaction_data = iter_sources(sources, jobs, registry, parsed)
+        session = IngestSession(
+            db, journal_mode, synchronous, cache_size, mmap_size, staging
+        )
+        with session:
+            insert_entries(transaction_data, db, batch_size)
+            if duplicates == "prompt":
+                # Other writers may need the database while the user answers
+                session.checkpoint()
+                _query_user(db)
+            else:
+                resolve_duplicates(db, duplicates)
+            preserve_potential(db)
+            clear_potential(db)
+            record_source_files(db, parsed)
+            if rules is not None:
+                apply_alias_rules(db, rules, batch_size)
+
+    if profiler is not None:
+        with click.open_file(profile, "w", lazy=False) as fp:
+            profiler.dump(fp)
 
 
 @click.group()
@@ -160,7 +305,7 @@ def missinglist(source):
 def create(source, description, name):
     with create_sql_connection(source) as db:
         ids = []
-        if "%" or "_" in description:
+        if "%" in description or "_" in description:
             for result in get_description_id_by_name_like(db, description):
                 ids.append(result[0])
         else:
@@ -192,7 +337,7 @@ def create(source, description, name):
 def replace(source, description, name):
     with create_sql_connection(source) as db:
         ids = []
-        if "%" or "_" in description:
+        if "%" in description or "_" in description:
             for result in get_description_id_by_name_like(db, description):
                 ids.append(result[0])
         else:
@@ -204,6 +349,26 @@ def replace(source, description, name):
             replace_alias(db, ids, name)
 
 
+@alias.command(help="Alias descriptions using a rules file")
+@click.option(
+    "--source",
+    prompt="Input data source",
+    help="Specify the input data source (database only)",
+    type=click.Path(exists=True, file_okay=True),
+)
+@click.option(
+    "--rules",
+    prompt="Alias rules file",
+    help="JSON or TOML file of ordered glob, regex or like rules.",
+    type=click.Path(exists=True, dir_okay=False),
+)
+def apply(source, rules):
+    alias_rules = _load_alias_rules(rules, "--rules")
+    with create_sql_connection(source) as db:
+        count = apply_alias_rules(db, alias_rules)
+        print(f"Aliased {count} descriptions")
+
+
 @click.command(help="Report data out")
 @click.option(
     "--source",
@@ -228,34 +393,185 @@ def replace(source, description, name):
 )
 @click.option(
     "--format",
-    type=click.Choice(["csv"], case_sensitive=False),
+    type=click.Choice(list(WRITERS), case_sensitive=False),
     default="csv",
-    help="Format of the report (default: csv)",
+    help=(
+        "Format of the report (default: csv). columnar and sqlite are binary and"
+        " need --output."
+    ),
 )
 @click.option(
     "--output",
     help="Output destination. Will print to console if nothing given",
 )
-def report(source, start, end, description, format, output):
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Let sqlite reports replace the --output file if it exists.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of rows read from the database at a time.",
+)
+@click.option(
+    "--match",
+    help="Full text query over descriptions, extra descriptions and aliases.",
+)
+@click.option(
+    "--group-by",
+    type=click.Choice(["month", "alias", "description"], case_sensitive=False),
+    help="Report totals and counts per group instead of every transaction.",
+)
+def report(
+    source,
+    start,
+    end,
+    description,
+    format,
+    output,
+    force,
+    batch_size,
+    match,
+    group_by,
+):
+    format = format.lower()
+    if output is None and WRITERS[format].needs_path:
+        raise click.BadParameter(
+            f"{format} reports need --output.", param_hint="--format"
+        )
+    if output is not None and Path(output).exists():
+        if Path(output).samefile(source):
+            raise click.BadParameter(
+                "The report can't replace the --source database.",
+                param_hint="--output",
+            )
+        if WRITERS[format].deletes_existing and not force:
+            raise click.BadParameter(
+                f"{output} already exists, use --force to replace it.",
+                param_hint="--output",
+            )
     with create_sql_connection(source) as db:
-        result = search(db, start, end, description)
+        try:
+            if group_by:
+                group_by = group_by.lower()
+                columns = summary_columns(group_by)
+                result = iter_summary(
+                    db, group_by, start, end, description, batch_size, match
+                )
+            else:
+                columns = SEARCH_COLUMNS
+                result = iter_search(db, start, end, description, batch_size, match)
+        except InvalidMatchQuery as e:
+            raise click.BadParameter(f"{e}", param_hint="--match")
+        write_report(result, columns, format, output, batch_size, force)
+
 
-        def format(data: tuple) -> str:
-            return f"{','.join(data)}\n"
+@click.command(help="Import csv files as they're added to a folder")
+@click.option(
+    "--source",
+    prompt="Input data folder",
+    help="Specify the folder to watch for CSV files",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+)
+@click.option(
+    "--output",
+    prompt="Output database",
+    help="Specify the output database location (directory or file)",
+)
+@click.option(
+    "--duplicates",
+    type=click.Choice(list(DUPLICATE_POLICIES)),
+    default="keep-one",
+    show_default=True,
+    help="How to handle possible duplicates, see insert --duplicates.",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    show_default=True,
+    help="Seconds between checks of the folder.",
+)
+@click.option(
+    "--settle",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="Seconds a file must be unmodified before it's imported.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of transactions held in memory before writing to the database.",
+)
+@click.option(
+    "--staging",
+    type=click.Choice(["disk", "memory"]),
+    default="memory",
+    show_default=True,
+    help="Where transactions wait while duplicates are checked.",
+)
+@click.option(
+    "--formats",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON or TOML file describing extra bank CSV formats. Can be repeated.",
+)
+@click.option(
+    "--alias-rules",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON or TOML alias rules file applied to new descriptions.",
+)
+def watch(
+    source,
+    output,
+    duplicates,
+    interval,
+    settle,
+    batch_size,
+    staging,
+    formats,
+    alias_rules,
+):
+    output_src = convert_output(output)
+    registry = _load_formats(formats)
+    rules = None
+    if alias_rules is not None:
+        rules = _load_alias_rules(alias_rules, "--alias-rules")
 
-        formatted_iter = map(format, result)
+    def report_ingest(files, count) -> None:
+        names = ", ".join(file.name for file in files)
+        print(f"Imported {count} transactions from {names}")
 
-        if output:
-            with open(output, "w") as fp:
-                fp.writelines(formatted_iter)
-        else:
-            for line in formatted_iter:
-                print(line, end="")
+    with create_sql_connection(output_src) as db:
+        watcher = Watcher(
+            source,
+            db,
+            registry,
+            duplicates,
+            interval,
+            settle,
+            batch_size,
+            staging,
+            rules,
+            report_ingest,
+        )
+        print(f"Watching {source}, press Ctrl+C to stop")
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            watcher.stop()
 
 
 cli.add_command(alias)
 cli.add_command(insert)
 cli.add_command(report)
+cli.add_command(watch)
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,125 @@
+import json
+import re
+from dataclasses import dataclass, field
+from fnmatch import translate
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterable, Optional
+
+from banksheets.config_files import load_file
+
+KINDS = ("glob", "regex", "like")
+
+
+class InvalidAliasRule(Exception):
+    def __init__(self, pattern: str, reason: str) -> None:
+        super().__init__(f"Alias rule {pattern} is invalid: {reason}")
+
+
+def _like_to_regex(pattern: str) -> str:
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts)
+
+
+@dataclass(frozen=True)
+class AliasRule:
+    """
+    Aliases every description matching a pattern. glob and like patterns match
+    the whole description and ignore case, the same as SQLite's LIKE. regex
+    patterns are searched for anywhere in the description, as written.
+
+    Args:
+        pattern - the pattern to match descriptions against
+        alias - the name given to matching descriptions
+        kind - one of KINDS
+    """
+
+    pattern: str
+    alias: str
+    kind: str = "glob"
+    regex: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.kind not in KINDS:
+            raise InvalidAliasRule(self.pattern, f"{self.kind} is not a rule kind")
+        try:
+            if self.kind == "glob":
+                regex = re.compile(translate(self.pattern), re.IGNORECASE)
+            elif self.kind == "like":
+                regex = re.compile(
+                    _like_to_regex(self.pattern), re.IGNORECASE | re.DOTALL
+                )
+            else:
+                regex = re.compile(self.pattern)
+        except re.error as e:
+            raise InvalidAliasRule(self.pattern, f"{e}")
+        object.__setattr__(self, "regex", regex)
+
+    def matches(self, description: str) -> bool:
+        if self.kind == "regex":
+            return self.regex.search(description) is not None
+        return self.regex.fullmatch(description) is not None
+
+
+class AliasRules:
+    """
+    An ordered list of alias rules, the first rule matching a description wins.
+    """
+
+    def __init__(self, rules: Iterable[AliasRule] = ()) -> None:
+        self._rules: list[AliasRule] = list(rules)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "AliasRules":
+        rules = cls()
+        rules.load(path)
+        return rules
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    @property
+    def rules_hash(self) -> str:
+        """Changes whenever a rule is added, removed, edited or reordered."""
+        data = [(rule.kind, rule.pattern, rule.alias) for rule in self._rules]
+        return sha256(json.dumps(data).encode()).hexdigest()
+
+    def add(self, rule: AliasRule) -> None:
+        self._rules.append(rule)
+
+    def match(self, description: str) -> Optional[str]:
+        """The alias of the first rule matching description, None if none do."""
+        for rule in self._rules:
+            if rule.matches(description):
+                return rule.alias
+        return None
+
+    def load(self, path: Path) -> None:
+        """Add every rule in a .json or .toml file, in order. Both hold a list of
+        tables under "aliases", each with pattern, alias and optionally kind.
+
+        Raises:
+            ValueError - the file type isn't supported
+            InvalidAliasRule - a rule is malformed
+        """
+        self.load_dict(load_file(path, "alias rules"))
+
+    def load_dict(self, data: dict) -> None:
+        for item in data.get("aliases", []):
+            try:
+                rule = AliasRule(
+                    item["pattern"], item["alias"], item.get("kind", "glob")
+                )
+            except KeyError as e:
+                raise InvalidAliasRule(item.get("pattern", "?"), f"missing {e}")
+            self.add(rule)
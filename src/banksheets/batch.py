@@ -0,0 +1,100 @@
+from array import array
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, Sequence, Union
+
+from banksheets.entry import DataEntry
+
+
+class TransactionBatch:
+    """
+    Parsed transactions stored column by column. Dates are kept as ordinals,
+    amounts as cents and descriptions as ids into a table of unique names, which
+    takes a fraction of the memory of the equivalent list of DataEntry.
+
+    Only the first extra description seen for each name is kept, in extra_descs,
+    since the database stores one per description.
+    """
+
+    __slots__ = (
+        "dates",
+        "cents",
+        "description_ids",
+        "descriptions",
+        "extra_descs",
+        "_name_ids",
+    )
+
+    def __init__(self) -> None:
+        self.dates = array("i")
+        self.cents = array("q")
+        self.description_ids = array("i")
+        self.descriptions: list[str] = []
+        self.extra_descs: list[Optional[str]] = []
+        self._name_ids: dict[str, int] = {}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Optional[DataEntry]]) -> "TransactionBatch":
+        batch = cls()
+        batch.extend(entries)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[DataEntry]:
+        for ordinal, cents, description_id in zip(
+            self.dates, self.cents, self.description_ids
+        ):
+            yield DataEntry(
+                datetime.fromordinal(ordinal),
+                cents / 100,
+                self.descriptions[description_id],
+                self.extra_descs[description_id],
+            )
+
+    def append(self, entry: DataEntry) -> None:
+        description_id = self._name_ids.get(entry.description)
+        if description_id is None:
+            description_id = len(self.descriptions)
+            self._name_ids[entry.description] = description_id
+            self.descriptions.append(entry.description)
+            self.extra_descs.append(entry.extra_desc)
+
+        self.dates.append(entry.date.toordinal())
+        self.cents.append(entry.cents)
+        self.description_ids.append(description_id)
+
+    def extend(self, entries: Iterable[Optional[DataEntry]]) -> int:
+        """Add entries to the batch, skipping any None.
+
+        Args:
+            entries - the entries to add
+        Returns:
+            The number of items consumed from entries, None included.
+        """
+        consumed = 0
+        for entry in entries:
+            consumed += 1
+            if entry is not None:
+                self.append(entry)
+        return consumed
+
+    def sql_rows(
+        self, description_ids: Optional[Sequence[int]] = None
+    ) -> Iterator[tuple[str, int, Union[str, int]]]:
+        """Yield (date, cents, description) ready to bind to a statement. Each
+        distinct date is only formatted once.
+
+        Args:
+            description_ids - database ids lined up with descriptions, yielded in
+                place of the names when given
+        """
+        labels = self.descriptions if description_ids is None else description_ids
+        iso_dates: dict[int, str] = {}
+        for ordinal, cents, description_id in zip(
+            self.dates, self.cents, self.description_ids
+        ):
+            iso = iso_dates.get(ordinal)
+            if iso is None:
+                iso = iso_dates[ordinal] = date.fromordinal(ordinal).isoformat()
+            yield iso, cents, labels[description_id]
@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python 3.10
+    tomllib = None
+
+
+def load_file(path: Path, contents: str) -> dict:
+    """Read a .json or .toml settings file.
+
+    Args:
+        path - the file to read
+        contents - what the file holds, e.g. "alias rules", for error messages
+    Returns:
+        the parsed top-level table
+    Raises:
+        ValueError - the file type isn't supported
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        with open(path, "r") as fp:
+            return json.load(fp)
+    if path.suffix == ".toml":
+        if tomllib is None:
+            raise ValueError(f"TOML {contents} need Python 3.11 or newer.")
+        with open(path, "rb") as fp:
+            return tomllib.load(fp)
+    raise ValueError(f"{path.name} is not a JSON or TOML file.")
@@ -1,3 +1,6 @@
+-- Version 0 of the schema. Changes since then live in upgrade_<version>.sql and
+-- are applied in order by create_sql_connection.
+
 PRAGMA foreign_keys = 1;
 
 CREATE TABLE IF NOT EXISTS description (
@@ -0,0 +1,19 @@
+-- A TEMP potential_transaction table shadows the one in the database file, so
+-- staged rows never touch the disk. Only the rows preserve_potential keeps are
+-- written to the file. IngestSession drops any leftover TEMP table first.
+
+PRAGMA temp_store = MEMORY;
+
+CREATE TEMP TABLE potential_transaction (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    amount INTEGER,
+    description_id INTEGER,
+    ordinal INTEGER,
+    fingerprint TEXT
+);
+
+CREATE INDEX temp.potential_transaction_key
+    ON potential_transaction(date, amount, description_id);
+CREATE UNIQUE INDEX temp.potential_transaction_fingerprint
+    ON potential_transaction(fingerprint);
@@ -0,0 +1,38 @@
+-- Store amounts as integer cents and index the columns used to find duplicates.
+
+CREATE TABLE bank_transaction_cents (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    amount INTEGER,
+    description_id INTEGER,
+    FOREIGN KEY(description_id) REFERENCES description(id)
+);
+
+INSERT INTO bank_transaction_cents (id, date, amount, description_id)
+SELECT id, date, CAST(ROUND(CAST(amount AS REAL) * 100) AS INTEGER), description_id
+FROM bank_transaction;
+
+DROP TABLE bank_transaction;
+ALTER TABLE bank_transaction_cents RENAME TO bank_transaction;
+
+CREATE TABLE potential_transaction_cents (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    amount INTEGER,
+    description_id INTEGER,
+    FOREIGN KEY(description_id) REFERENCES description(id)
+);
+
+INSERT INTO potential_transaction_cents (id, date, amount, description_id)
+SELECT id, date, CAST(ROUND(CAST(amount AS REAL) * 100) AS INTEGER), description_id
+FROM potential_transaction;
+
+DROP TABLE potential_transaction;
+ALTER TABLE potential_transaction_cents RENAME TO potential_transaction;
+
+CREATE INDEX bank_transaction_key
+    ON bank_transaction(date, amount, description_id);
+CREATE INDEX bank_transaction_description
+    ON bank_transaction(description_id);
+CREATE INDEX potential_transaction_key
+    ON potential_transaction(date, amount, description_id);
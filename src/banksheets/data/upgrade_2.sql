@@ -0,0 +1,16 @@
+-- Monthly totals per description so reports don't rescan every transaction.
+-- preserve_potential adds to it as rows move into bank_transaction.
+
+CREATE TABLE monthly_summary (
+    month TEXT NOT NULL,
+    description_id INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    PRIMARY KEY (month, description_id),
+    FOREIGN KEY (description_id) REFERENCES description(id)
+) WITHOUT ROWID;
+
+INSERT INTO monthly_summary (month, description_id, total, transaction_count)
+SELECT substr(date, 1, 7), description_id, SUM(amount), COUNT(*)
+FROM bank_transaction
+GROUP BY substr(date, 1, 7), description_id;
@@ -0,0 +1,10 @@
+-- Source files that have been imported. Unchanged files are skipped and files
+-- that only grew are read from row_offset, the number of bytes already imported.
+
+CREATE TABLE source_file (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    row_offset INTEGER NOT NULL
+);
@@ -0,0 +1,39 @@
+-- Number repeated transactions and fingerprint them. The nth transaction with
+-- the same date, amount and description gets ordinal n, which makes the
+-- fingerprint unique, so a staged row can be matched to a saved one with a
+-- single index lookup.
+
+ALTER TABLE bank_transaction ADD COLUMN ordinal INTEGER;
+ALTER TABLE bank_transaction ADD COLUMN fingerprint TEXT;
+ALTER TABLE potential_transaction ADD COLUMN ordinal INTEGER;
+ALTER TABLE potential_transaction ADD COLUMN fingerprint TEXT;
+
+-- Correlated subqueries rather than UPDATE ... FROM, which needs SQLite 3.33.
+UPDATE bank_transaction
+SET ordinal = (
+    SELECT COUNT(*)
+    FROM bank_transaction earlier
+    WHERE earlier.date = bank_transaction.date
+        AND earlier.amount = bank_transaction.amount
+        AND earlier.description_id = bank_transaction.description_id
+        AND earlier.id <= bank_transaction.id
+);
+UPDATE bank_transaction
+SET fingerprint = transaction_fingerprint(date, amount, description_id, ordinal);
+
+UPDATE potential_transaction
+SET ordinal = (
+    SELECT COUNT(*)
+    FROM potential_transaction earlier
+    WHERE earlier.date = potential_transaction.date
+        AND earlier.amount = potential_transaction.amount
+        AND earlier.description_id = potential_transaction.description_id
+        AND earlier.id <= potential_transaction.id
+);
+UPDATE potential_transaction
+SET fingerprint = transaction_fingerprint(date, amount, description_id, ordinal);
+
+CREATE UNIQUE INDEX bank_transaction_fingerprint
+    ON bank_transaction(fingerprint);
+CREATE UNIQUE INDEX potential_transaction_fingerprint
+    ON potential_transaction(fingerprint);
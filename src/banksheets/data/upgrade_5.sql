@@ -0,0 +1,41 @@
+-- Keep the name a description is shown and searched by, its alias if it has one,
+-- on the description itself so reports filter on an index instead of joining
+-- description_alias for every row.
+
+ALTER TABLE description ADD COLUMN display_name TEXT;
+
+UPDATE description
+SET display_name = COALESCE(
+    (SELECT da.name FROM description_alias da WHERE da.description_id = description.id),
+    name
+);
+
+CREATE INDEX description_display_name ON description(display_name);
+
+CREATE TRIGGER description_display_name_insert
+AFTER INSERT ON description
+WHEN NEW.display_name IS NULL
+BEGIN
+    UPDATE description SET display_name = NEW.name WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER description_alias_insert
+AFTER INSERT ON description_alias
+BEGIN
+    UPDATE description SET display_name = COALESCE(NEW.name, name)
+    WHERE id = NEW.description_id;
+END;
+
+CREATE TRIGGER description_alias_update
+AFTER UPDATE ON description_alias
+BEGIN
+    UPDATE description SET display_name = name WHERE id = OLD.description_id;
+    UPDATE description SET display_name = COALESCE(NEW.name, name)
+    WHERE id = NEW.description_id;
+END;
+
+CREATE TRIGGER description_alias_delete
+AFTER DELETE ON description_alias
+BEGIN
+    UPDATE description SET display_name = name WHERE id = OLD.description_id;
+END;
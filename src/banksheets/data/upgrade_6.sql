@@ -0,0 +1,12 @@
+-- Aliases set by an alias rules file are flagged so a changed file can replace
+-- them without touching aliases made by hand. alias_rule_state remembers the
+-- last rules applied and the newest description they were applied to, so later
+-- imports only check descriptions added since.
+
+ALTER TABLE description_alias ADD COLUMN from_rule INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE alias_rule_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    rules_hash TEXT NOT NULL,
+    last_description_id INTEGER NOT NULL
+);
@@ -0,0 +1,41 @@
+-- Full text index over descriptions, their first extra description and their
+-- alias. description is the content table, triggers keep the index in step.
+-- A NULL display_name is about to be filled in with the name by
+-- description_display_name_insert, so the index is given the name up front and
+-- that update is skipped.
+
+ALTER TABLE description ADD COLUMN extra_desc TEXT;
+
+CREATE VIRTUAL TABLE description_fts USING fts5(
+    name,
+    extra_desc,
+    display_name,
+    content = 'description',
+    content_rowid = 'id'
+);
+
+INSERT INTO description_fts(description_fts) VALUES ('rebuild');
+
+CREATE TRIGGER description_fts_insert
+AFTER INSERT ON description
+BEGIN
+    INSERT INTO description_fts(rowid, name, extra_desc, display_name)
+    VALUES (NEW.id, NEW.name, NEW.extra_desc, COALESCE(NEW.display_name, NEW.name));
+END;
+
+CREATE TRIGGER description_fts_update
+AFTER UPDATE OF name, extra_desc, display_name ON description
+WHEN OLD.display_name IS NOT NULL
+BEGIN
+    INSERT INTO description_fts(description_fts, rowid, name, extra_desc, display_name)
+    VALUES ('delete', OLD.id, OLD.name, OLD.extra_desc, OLD.display_name);
+    INSERT INTO description_fts(rowid, name, extra_desc, display_name)
+    VALUES (NEW.id, NEW.name, NEW.extra_desc, NEW.display_name);
+END;
+
+CREATE TRIGGER description_fts_delete
+AFTER DELETE ON description
+BEGIN
+    INSERT INTO description_fts(description_fts, rowid, name, extra_desc, display_name)
+    VALUES ('delete', OLD.id, OLD.name, OLD.extra_desc, OLD.display_name);
+END;
@@ -1,9 +1,42 @@
+import re
 from dataclasses import dataclass
 from datetime import datetime
-from locale import LC_ALL, atof, setlocale
+from functools import lru_cache
+from locale import LC_ALL, atof, localeconv, setlocale
+from typing import Iterable, Iterator, Optional, Sequence
 
 
-@dataclass(order=True, frozen=True)
+@lru_cache(maxsize=None)
+def _use_user_locale() -> None:
+    # setlocale is process wide and slow, so only resolve it once per run.
+    setlocale(LC_ALL, "")
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text: str) -> datetime:
+    return datetime.strptime(text, "%m/%d/%Y")
+
+
+# Amounts float() reads the same way as atof in a locale with a . decimal point
+_PLAIN_AMOUNT = re.compile(r"-?\d+(\.\d+)?")
+
+
+@lru_cache(maxsize=None)
+def _plain_amounts_match_locale() -> bool:
+    _use_user_locale()
+    conventions = localeconv()
+    return conventions["decimal_point"] == "." and conventions["thousands_sep"] != "."
+
+
+def _parse_amount(text: str) -> float:
+    if _PLAIN_AMOUNT.fullmatch(text) and _plain_amounts_match_locale():
+        return float(text)
+    # The locale decides grouped or localized numbers, e.g. 1,234.56 or 1.234,56
+    _use_user_locale()
+    return atof(text)
+
+
+@dataclass(order=True, frozen=True, slots=True)
 class DataEntry:
     date: datetime
     amount: float
@@ -11,9 +44,48 @@ class DataEntry:
     extra_desc: str = ""
 
     def __post_init__(self):
-        setlocale(LC_ALL, "")
-        object.__setattr__(self, "date", datetime.strptime(self.date, "%m/%d/%Y"))
-        object.__setattr__(self, "amount", atof(self.amount))
+        if not isinstance(self.date, datetime):
+            object.__setattr__(self, "date", _parse_date(self.date))
+        if not isinstance(self.amount, float):
+            object.__setattr__(self, "amount", _parse_amount(self.amount))
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[dict[str, str]]
+    ) -> Iterator[Optional["DataEntry"]]:
+        """Build entries from csv rows.
+
+        Args:
+            rows - the transaction rows from csv
+        Returns:
+            The entries, None in place of a row that can't be parsed
+        """
+        for row in rows:
+            try:
+                yield cls(**row)
+            except ValueError:
+                yield None
+
+    @classmethod
+    def from_tuples(
+        cls, records: Iterable[Sequence[str]]
+    ) -> Iterator[Optional["DataEntry"]]:
+        """Build entries from (date, amount, description[, extra_desc]) records.
+
+        Args:
+            records - the transaction records, e.g. from SkipAheadReader
+        Returns:
+            The entries, None in place of a record that can't be parsed
+        """
+        for record in records:
+            try:
+                yield cls(*record)
+            except ValueError:
+                yield None
+
+    @property
+    def cents(self) -> int:
+        return round(self.amount * 100)
 
     def __str__(self) -> str:
         return (
@@ -0,0 +1,123 @@
+import json
+from dataclasses import dataclass, field
+from importlib.resources import files
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence
+
+from banksheets.config_files import load_file
+
+# DataEntry fields in constructor order, the first three are required.
+FIELDS = ("date", "amount", "description", "extra_desc")
+_REQUIRED_FIELDS = FIELDS[:3]
+
+
+class InvalidBankFormat(Exception):
+    def __init__(self, name: str, reason: str) -> None:
+        super().__init__(f"Bank format {name} is invalid: {reason}")
+
+
+def _signature(headers: Iterable[str]) -> tuple[str, ...]:
+    return tuple(header.strip().strip('"') for header in headers)
+
+
+@dataclass(frozen=True)
+class BankFormat:
+    """
+    The layout of one bank's csv export.
+
+    Args:
+        name - a label for the format
+        headers - the header row, in file order
+        columns - which header holds each of FIELDS, extra_desc is optional
+    """
+
+    name: str
+    headers: tuple[str, ...]
+    columns: dict[str, str] = field(hash=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "headers", _signature(self.headers))
+        for key in _REQUIRED_FIELDS:
+            if key not in self.columns:
+                raise InvalidBankFormat(self.name, f"no column for {key}")
+        for key, header in self.columns.items():
+            if key not in FIELDS:
+                raise InvalidBankFormat(self.name, f"{key} is not a field")
+            if header not in self.headers:
+                raise InvalidBankFormat(self.name, f"{header} is not a header")
+
+    @property
+    def fieldnames(self) -> list[Optional[str]]:
+        """The field each header maps to, None for unused headers."""
+        by_header = {header: key for key, header in self.columns.items()}
+        return [by_header.get(header) for header in self.headers]
+
+    def compile(self) -> Callable[[Sequence[str]], tuple[str, ...]]:
+        """Build a function turning a csv.reader row into a tuple of FIELDS.
+
+        Raises:
+            IndexError from the returned function if the row is too short.
+        """
+        indexes = [
+            self.headers.index(self.columns[key])
+            for key in FIELDS
+            if key in self.columns
+        ]
+        return itemgetter(*indexes)
+
+
+class FormatRegistry:
+    """
+    The bank formats BankSheets knows about, looked up by their header row.
+    Formats registered later replace earlier ones with the same headers.
+    """
+
+    def __init__(self, formats: Iterable[BankFormat] = ()) -> None:
+        self._formats: dict[tuple[str, ...], BankFormat] = {}
+        for bank_format in formats:
+            self.register(bank_format)
+
+    @classmethod
+    def builtin(cls) -> "FormatRegistry":
+        """A registry holding the formats shipped with BankSheets."""
+        registry = cls()
+        resources = files("banksheets.data")
+        with open(resources / "formats.json", "r") as fp:
+            registry.load_dict(json.load(fp))
+        return registry
+
+    def __contains__(self, headers: Sequence[str]) -> bool:
+        return _signature(headers) in self._formats
+
+    def __iter__(self):
+        return iter(self._formats.values())
+
+    def __len__(self) -> int:
+        return len(self._formats)
+
+    def register(self, bank_format: BankFormat) -> None:
+        self._formats[bank_format.headers] = bank_format
+
+    def find(self, headers: Sequence[str]) -> Optional[BankFormat]:
+        return self._formats.get(_signature(headers))
+
+    def load(self, path: Path) -> None:
+        """Register every format in a .json or .toml file. Both hold a list of
+        tables under "formats", each with name, headers and columns.
+
+        Raises:
+            ValueError - the file type isn't supported
+            InvalidBankFormat - a format doesn't line up with its headers
+        """
+        self.load_dict(load_file(path, "bank formats"))
+
+    def load_dict(self, data: dict) -> None:
+        for item in data.get("formats", []):
+            try:
+                bank_format = BankFormat(
+                    item["name"], tuple(item["headers"]), dict(item["columns"])
+                )
+            except KeyError as e:
+                raise InvalidBankFormat(item.get("name", "?"), f"missing {e}")
+            self.register(bank_format)
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from queue import Empty, Queue
+from sqlite3 import connect
+from typing import Callable, Iterator, Optional, TypeVar
+
+from banksheets.sql_commands import (
+    SCHEMA_VERSION,
+    BankSheetsConnection,
+    DuplicateGroup,
+    get_descriptions_missing_alias,
+    get_duplicate_groups,
+    get_potential_duplicates,
+    iter_summary,
+    register_functions,
+    search,
+)
+
+T = TypeVar("T")
+
+
+def open_read_connection(path: Path) -> BankSheetsConnection:
+    """Open a read-only connection that may be used from any thread, one at a
+    time.
+    """
+    connection = connect(
+        f"{Path(path).resolve().as_uri()}?mode=ro",
+        uri=True,
+        factory=BankSheetsConnection,
+        check_same_thread=False,
+    )
+    register_functions(connection)
+    connection.execute("PRAGMA query_only = 1;")
+    return connection
+
+
+class ReadPool:
+    """
+    A fixed set of read-only connections to a database file shared by a thread
+    pool, so reports can run concurrently with each other and with an import.
+    The pool never writes, so the database has to be upgraded already, and be
+    in WAL mode for reads to carry on while a writer commits. Set that up when
+    writing, with insert --journal-mode wal or create_sql_connection.
+
+    Queries only see committed data. Transactions staged by an import with
+    in-memory staging aren't visible at all.
+
+    Args:
+        path - the database file, it has to exist
+        size - the number of connections and worker threads
+    Raises:
+        ValueError - the schema of the database is out of date
+    """
+
+    def __init__(self, path: Path, size: int = 4) -> None:
+        if size < 1:
+            raise ValueError("A read pool needs at least one connection.")
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"{path} doesn't exist.")
+
+        # None in the queue marks a closed pool, see connection
+        self._connections: Queue[Optional[BankSheetsConnection]] = Queue()
+        for _ in range(size):
+            self._connections.put(open_read_connection(path))
+        self._lock = threading.Lock()
+        self._closed = False
+        with self.connection() as connection:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            self._close_idle()
+            raise ValueError(
+                f"{path} needs upgrading, open it with create_sql_connection first."
+            )
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="banksheets-read"
+        )
+        self.size = size
+
+    def __enter__(self) -> "ReadPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Wait for queries running on the worker threads and close the
+        connections. A connection still borrowed elsewhere is closed when it's
+        given back.
+        """
+        self._executor.shutdown(wait=True)
+        self._close_idle()
+
+    def _close_idle(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    connection = self._connections.get_nowait()
+                except Empty:
+                    break
+                connection.close()
+            # Wakes anyone waiting for a connection, who passes it on
+            self._connections.put(None)
+
+    @contextmanager
+    def connection(self) -> Iterator[BankSheetsConnection]:
+        """Borrow a connection, waiting for one to be free.
+
+        Raises:
+            RuntimeError - the pool is closed
+        """
+        connection = self._connections.get()
+        if connection is None:
+            self._connections.put(None)
+            raise RuntimeError("The read pool is closed.")
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                if self._closed:
+                    connection.close()
+                else:
+                    self._connections.put(connection)
+
+    def run(self, query: Callable[..., T], *args, **kwargs) -> T:
+        """Call query(connection, *args, **kwargs) on a borrowed connection in
+        this thread. The result mustn't be lazy, the connection goes back to the
+        pool once query returns.
+        """
+        with self.connection() as connection:
+            return query(connection, *args, **kwargs)
+
+    def submit(self, query: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        """Like run but on a worker thread."""
+        return self._executor.submit(self.run, query, *args, **kwargs)
+
+    async def run_async(self, query: Callable[..., T], *args, **kwargs) -> T:
+        """Like run but awaited, on a worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self.run, query, *args, **kwargs)
+        )
+
+    async def search(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        filter: Optional[str] = None,
+        match: Optional[str] = None,
+    ) -> list[tuple]:
+        return await self.run_async(search, start_date, end_date, filter, match)
+
+    async def summary(
+        self,
+        group_by: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        filter: Optional[str] = None,
+        match: Optional[str] = None,
+    ) -> list[tuple]:
+        def query(connection: BankSheetsConnection) -> list[tuple]:
+            return list(
+                iter_summary(
+                    connection, group_by, start_date, end_date, filter, match=match
+                )
+            )
+
+        return await self.run_async(query)
+
+    async def descriptions_missing_alias(self) -> list[tuple[str]]:
+        return await self.run_async(get_descriptions_missing_alias)
+
+    async def duplicate_groups(self) -> list[DuplicateGroup]:
+        return await self.run_async(get_duplicate_groups)
+
+    async def potential_duplicates(self) -> list[tuple]:
+        return await self.run_async(get_potential_duplicates)
@@ -0,0 +1,164 @@
+import json
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import IO, Iterable, Iterator, Optional, TypeVar
+
+# Set to a file path, or - for stderr, to profile the insert command.
+ENV_VAR = "BANKSHEETS_PROFILE"
+
+T = TypeVar("T")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    rejected: int = 0
+
+
+@dataclass
+class StatementStats:
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class Profiler:
+    """
+    Collects wall time and row counts per stage, plus the time spent in each SQL
+    statement run through a BankSheetsConnection. A disabled profiler records
+    nothing and costs next to nothing, which is the default.
+
+    Stage times include any stages nested inside them. The time of a streamed
+    stage is the time spent producing its items, see iterate. Statements are
+    filed under the innermost stage timed with stage() when they ran.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: dict[str, StageStats] = {}
+        self.statements: dict[tuple[Optional[str], str], StatementStats] = {}
+        self._started = time.perf_counter()
+        self._running: list[str] = []
+
+    def _stage(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    def stage(self, name: str, rows: int = 0):
+        """Context manager timing one call of a stage."""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name, rows)
+
+    @contextmanager
+    def _timed(self, name: str, rows: int) -> Iterator[None]:
+        start = time.perf_counter()
+        self._running.append(name)
+        try:
+            yield
+        finally:
+            self._running.pop()
+            stats = self._stage(name)
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - start
+            stats.rows += rows
+
+    def count(self, name: str, rows: int = 0, rejected: int = 0) -> None:
+        if self.enabled:
+            stats = self._stage(name)
+            stats.rows += rows
+            stats.rejected += rejected
+
+    def iterate(self, name: str, items: Iterable[Optional[T]]) -> Iterator[Optional[T]]:
+        """Time producing each item of a stream and count the items, None items
+        are counted as rejected rows.
+        """
+        if not self.enabled:
+            return iter(items)
+        return self._iterate(name, items)
+
+    def _iterate(
+        self, name: str, items: Iterable[Optional[T]]
+    ) -> Iterator[Optional[T]]:
+        stats = self._stage(name)
+        stats.calls += 1
+        iterator = iter(items)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stats.seconds += clock() - start
+                return
+            stats.seconds += clock() - start
+            if item is None:
+                stats.rejected += 1
+            else:
+                stats.rows += 1
+            yield item
+
+    def merge(self, stages: dict[str, StageStats]) -> None:
+        """Add stage stats collected elsewhere, e.g. by a worker process."""
+        if self.enabled:
+            for name, other in stages.items():
+                stats = self._stage(name)
+                stats.calls += other.calls
+                stats.seconds += other.seconds
+                stats.rows += other.rows
+                stats.rejected += other.rejected
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        return self._running[-1] if self._running else None
+
+    def record_statement(self, sql: str, seconds: float) -> None:
+        if self.enabled:
+            key = (self.current_stage, _WHITESPACE.sub(" ", sql).strip())
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats()
+            stats.calls += 1
+            stats.seconds += seconds
+
+    def summary(self) -> dict:
+        return {
+            "seconds": time.perf_counter() - self._started,
+            "stages": {name: asdict(stats) for name, stats in self.stages.items()},
+            "statements": [
+                {"stage": stage, "sql": sql, **asdict(stats)}
+                for (stage, sql), stats in sorted(
+                    self.statements.items(), key=lambda item: -item[1].seconds
+                )
+            ],
+        }
+
+    def dump(self, fp: IO[str]) -> None:
+        json.dump(self.summary(), fp, indent=2)
+        fp.write("\n")
+
+
+_profiler = Profiler(enabled=False)
+
+
+def get_profiler() -> Profiler:
+    return _profiler
+
+
+def enable_profiling() -> Profiler:
+    """Start collecting into a new profiler and return it."""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable_profiling() -> Profiler:
+    global _profiler
+    _profiler = Profiler(enabled=False)
+    return _profiler
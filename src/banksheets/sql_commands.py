@@ -1,103 +1,639 @@
+from hashlib import blake2b
 from importlib.resources import files
+from itertools import islice
 from pathlib import Path
-from sqlite3 import Connection, connect
-from typing import Optional
+from sqlite3 import Connection, Cursor, OperationalError, connect
+from time import perf_counter
+from typing import Iterable, Iterator, NamedTuple, Optional, Sequence, Union
 
+from banksheets.aliases import AliasRules
+from banksheets.batch import TransactionBatch
 from banksheets.entry import DataEntry
+from banksheets.profiling import get_profiler
 
+Entries = Union[TransactionBatch, Iterable[Optional[DataEntry]]]
 
-def create_sql_connection(path: Path):
+DEFAULT_BATCH_SIZE = 10_000
+
+
+class DuplicateGroup(NamedTuple):
+    """Staged transactions that share a date, amount and description."""
+
+    ids: list[int]
+    staged_count: int
+    saved_count: int
+    details: tuple
+
+
+class InvalidMatchQuery(Exception):
+    def __init__(self, query: str, reason: str) -> None:
+        super().__init__(f"Full text query {query} is invalid: {reason}")
+
+
+class SourceFile(NamedTuple):
+    """A csv file as it was when it was last imported."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    row_offset: int
+
+
+# Applied in order on top of schema.sql, PRAGMA user_version records how many ran.
+_SCHEMA_UPGRADES = (
+    "upgrade_1.sql",
+    "upgrade_2.sql",
+    "upgrade_3.sql",
+    "upgrade_4.sql",
+    "upgrade_5.sql",
+    "upgrade_6.sql",
+    "upgrade_7.sql",
+)
+SCHEMA_VERSION = len(_SCHEMA_UPGRADES)
+
+# Which staged rows each policy deletes. Every check is a fingerprint lookup, the
+# nth staged copy of a transaction is saved already if its fingerprint is.
+DUPLICATE_POLICIES = {
+    "keep-all": None,
+    "keep-one": (
+        "ordinal > 1 OR transaction_fingerprint(date, amount, description_id, 1)"
+        " IN (SELECT fingerprint FROM bank_transaction)"
+    ),
+    "keep-max-of-file-count": (
+        "fingerprint IN (SELECT fingerprint FROM bank_transaction)"
+    ),
+    "trust-db": (
+        "transaction_fingerprint(date, amount, description_id, 1)"
+        " IN (SELECT fingerprint FROM bank_transaction)"
+    ),
+}
+_MATCH_CONDITION = (
+    "d.id IN (SELECT rowid FROM description_fts WHERE description_fts MATCH ?)"
+)
+_MATCH_CHECK = (
+    "SELECT rowid FROM description_fts WHERE description_fts MATCH ? LIMIT 1;"
+)
+_SUMMARY_KEYS = {
+    "month": "ms.month",
+    "description": "d.name",
+    "alias": "d.display_name",
+}
+
+
+_STAGING_MODES = ("disk", "memory")
+_DROP_STAGING = "DROP TABLE IF EXISTS temp.potential_transaction;"
+_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+_SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class BankSheetsConnection(Connection):
+    """
+    Connection whose commit() is held back while an IngestSession is open.
+    Statements run through execute and executemany are timed when profiling.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.session_depth = 0
+
+    def commit(self) -> None:
+        if self.session_depth == 0:
+            super().commit()
+
+    def execute(self, sql: str, parameters=(), /) -> Cursor:
+        profiler = get_profiler()
+        if not profiler.enabled:
+            return super().execute(sql, parameters)
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profiler.record_statement(sql, perf_counter() - start)
+
+    def executemany(self, sql: str, parameters, /) -> Cursor:
+        profiler = get_profiler()
+        if not profiler.enabled:
+            return super().executemany(sql, parameters)
+        start = perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            profiler.record_statement(sql, perf_counter() - start)
+
+
+class IngestSession:
+    """
+    Runs everything inside the with block as one transaction. The commits made by
+    the functions in this module are deferred until the block ends, and the
+    whole session is rolled back if it raises.
+
+    Pragmas left as None keep the SQLite defaults. journal_mode is a property of
+    the database file and sticks around after the session.
+
+    With staging="memory" the potential_transaction table is swapped for an
+    in-memory TEMP table for the length of the session. Anything still staged
+    when the session ends is thrown away, even if the commit fails.
+    """
+
+    def __init__(
+        self,
+        sql_connection: "BankSheetsConnection",
+        journal_mode: Optional[str] = None,
+        synchronous: Optional[str] = None,
+        cache_size: Optional[int] = None,
+        mmap_size: Optional[int] = None,
+        staging: str = "disk",
+    ) -> None:
+        if staging not in _STAGING_MODES:
+            raise ValueError(f"{staging} is not a staging mode.")
+        if journal_mode is not None and journal_mode.upper() not in _JOURNAL_MODES:
+            raise ValueError(f"{journal_mode} is not a journal mode.")
+        if synchronous is not None and synchronous.upper() not in _SYNCHRONOUS_MODES:
+            raise ValueError(f"{synchronous} is not a synchronous setting.")
+
+        self.sql_connection = sql_connection
+        self.staging = staging
+        self.pragmas = {
+            "journal_mode": journal_mode and journal_mode.upper(),
+            "synchronous": synchronous and synchronous.upper(),
+            "cache_size": None if cache_size is None else int(cache_size),
+            "mmap_size": None if mmap_size is None else int(mmap_size),
+        }
+
+    def __enter__(self) -> "BankSheetsConnection":
+        if self.sql_connection.in_transaction:
+            Connection.commit(self.sql_connection)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                self.sql_connection.execute(f"PRAGMA {name} = {value};")
+        if self.staging == "memory":
+            self.sql_connection.execute(_DROP_STAGING)
+            with open(files("banksheets.data") / "staging.sql", "r") as fp:
+                self.sql_connection.executescript(fp.read())
+        self.sql_connection.session_depth += 1
+        return self.sql_connection
+
+    def checkpoint(self) -> None:
+        """Commit the work so far and carry on with the session, releasing the
+        write lock. Use before waiting on anything slow, like a person.
+        Transactions staged in memory stay staged.
+        """
+        Connection.commit(self.sql_connection)
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.sql_connection.session_depth -= 1
+        try:
+            if exc_type is None:
+                self.sql_connection.commit()
+            else:
+                self.sql_connection.rollback()
+        except BaseException:
+            self.sql_connection.rollback()
+            raise
+        finally:
+            if self.staging == "memory":
+                self.sql_connection.execute(_DROP_STAGING)
+
+
+def _fingerprint(date: str, amount: int, description_id: int, ordinal: int) -> str:
+    key = f"{date}|{amount}|{description_id}|{ordinal}".encode()
+    return blake2b(key, digest_size=16).hexdigest()
+
+
+def register_functions(sql_connection: Connection) -> None:
+    """Add the SQL functions the schema and queries rely on to a connection."""
+    sql_connection.create_function(
+        "transaction_fingerprint", 4, _fingerprint, deterministic=True
+    )
+
+
+def create_sql_connection(
+    path: Path, journal_mode: Optional[str] = None
+) -> BankSheetsConnection:
+    """Open a database, creating and upgrading the schema as needed.
+
+    Args:
+        path - the database file
+        journal_mode - set the journal mode of the file, e.g. WAL so a ReadPool
+            can keep reading while this connection writes
+    Raises:
+        ValueError - journal_mode isn't a journal mode
+    """
+    if journal_mode is not None and journal_mode.upper() not in _JOURNAL_MODES:
+        raise ValueError(f"{journal_mode} is not a journal mode.")
     connection = None
     resources = files("banksheets.data")
     schema = "schema.sql"
     with open(resources / schema, "r") as fp:
-        connection = connect(path)
+        connection = connect(path, factory=BankSheetsConnection)
+        register_functions(connection)
         connection.executescript(fp.read())
+    _upgrade_schema(connection)
+    if journal_mode is not None:
+        connection.execute(f"PRAGMA journal_mode = {journal_mode.upper()};")
     return connection
 
 
+def _upgrade_schema(sql_connection: Connection) -> None:
+    resources = files("banksheets.data")
+    version = sql_connection.execute("PRAGMA user_version;").fetchone()[0]
+    for number, upgrade in enumerate(_SCHEMA_UPGRADES[version:], start=version + 1):
+        with open(resources / upgrade, "r") as fp:
+            script = fp.read()
+        try:
+            sql_connection.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;"
+            )
+        except Exception:
+            sql_connection.rollback()
+            raise
+
+
+def _batches(
+    data_entries: Iterable[Optional[DataEntry]], size: int
+) -> Iterator[TransactionBatch]:
+    iterator = iter(data_entries)
+    while True:
+        batch = TransactionBatch()
+        if batch.extend(islice(iterator, size)) == 0:
+            return
+        yield batch
+
+
+class DescriptionCache:
+    """
+    Maps description names to ids. The description table is read once and new
+    names are inserted and looked up in bulk, so transactions can be inserted
+    with concrete ids instead of looking each name up.
+
+    SQLite assigns the ids of new names, so other connections may add
+    descriptions while the cache is in use.
+    """
+
+    # Names looked up per statement, well under SQLite's parameter limit
+    _LOOKUP_SIZE = 500
+
+    def __init__(self, sql_connection: Connection) -> None:
+        self.sql_connection = sql_connection
+        cursor = sql_connection.execute("SELECT name, id FROM description;")
+        self._ids: dict[str, int] = dict(cursor.fetchall())
+
+    def ids(
+        self,
+        names: Iterable[str],
+        extra_descs: Optional[Sequence[Optional[str]]] = None,
+    ) -> list[int]:
+        """Get the id for each name, inserting the names not seen before.
+
+        Args:
+            names - the description names
+            extra_descs - extra descriptions lined up with names, stored with
+                names inserted now
+        Returns:
+            The ids in the same order as names.
+        """
+        names = list(names)
+        missing: dict[str, Optional[str]] = {}
+        for index, name in enumerate(names):
+            if name not in self._ids and name not in missing:
+                missing[name] = None if extra_descs is None else extra_descs[index]
+
+        if missing:
+            # Names another connection added since the cache was read are kept
+            self.sql_connection.executemany(
+                "INSERT OR IGNORE INTO description(name, extra_desc, display_name)"
+                " VALUES (?, ?, ?);",
+                ((name, extra_desc, name) for name, extra_desc in missing.items()),
+            )
+            pending = iter(missing)
+            while chunk := list(islice(pending, self._LOOKUP_SIZE)):
+                placeholders = ", ".join("?" * len(chunk))
+                cursor = self.sql_connection.execute(
+                    f"SELECT name, id FROM description WHERE name IN ({placeholders});",
+                    chunk,
+                )
+                self._ids.update(cursor.fetchall())
+
+        return [self._ids[name] for name in names]
+
+
+def _as_batch(data_entries: Entries) -> TransactionBatch:
+    if isinstance(data_entries, TransactionBatch):
+        return data_entries
+    return TransactionBatch.from_entries(data_entries)
+
+
 def insert_descriptions(
-    data_entries: list[DataEntry], sql_connection: Connection
+    data_entries: Entries,
+    sql_connection: Connection,
+    descriptions: Optional[DescriptionCache] = None,
 ) -> None:
     if data_entries is None:
         raise TypeError()
 
-    to_insert = []
-    for datum in data_entries:
-        if datum is not None:
-            to_insert.append((datum.description,))
-
-    sql_connection.executemany(
-        "INSERT OR IGNORE INTO description(name) VALUES (?);", to_insert
-    )
+    if descriptions is None:
+        descriptions = DescriptionCache(sql_connection)
+    batch = _as_batch(data_entries)
+    descriptions.ids(batch.descriptions, batch.extra_descs)
     sql_connection.commit()
 
 
 def insert_potential_transactions(
-    data_entries: list[DataEntry], sql_connection: Connection
+    data_entries: Entries,
+    sql_connection: Connection,
+    descriptions: Optional[DescriptionCache] = None,
 ):
-    to_insert = []
-    for entry in data_entries:
-        if entry is not None:
-            to_insert.append(
-                (entry.date.strftime(r"%Y-%m-%d"), entry.amount, entry.description)
-            )
-    sql_connection.executemany(
-        "INSERT OR IGNORE INTO potential_transaction(date, amount, description_id)"
-        " VALUES (?, ?, (SELECT id FROM description WHERE name=?));",
-        to_insert,
+    """Stage entries in the potential table, adding any new descriptions.
+
+    Args:
+        data_entries - the entries to stage
+        sql_connection - an active sql connection
+        descriptions - a cache shared across calls, one is made if not given
+    """
+    batch = _as_batch(data_entries)
+    if descriptions is None:
+        descriptions = DescriptionCache(sql_connection)
+    profiler = get_profiler()
+    with profiler.stage("descriptions", len(batch.descriptions)):
+        description_ids = descriptions.ids(batch.descriptions, batch.extra_descs)
+    with profiler.stage("stage", len(batch)):
+        first_id = sql_connection.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM potential_transaction;"
+        ).fetchone()[0]
+        sql_connection.executemany(
+            "INSERT INTO potential_transaction(date, amount, description_id)"
+            " VALUES (?, ?, ?);",
+            batch.sql_rows(description_ids),
+        )
+        _number_potential(sql_connection, first_id)
+        sql_connection.commit()
+
+
+def _number_potential(sql_connection: Connection, first_id: int) -> None:
+    """Give staged rows from first_id onwards their ordinal and fingerprint,
+    counting on from any copies staged earlier.
+    """
+    # Correlated subqueries rather than UPDATE ... FROM, which needs SQLite 3.33.
+    # Both are lookups on potential_transaction_key.
+    statement = """
+UPDATE potential_transaction
+SET ordinal = COALESCE((
+        SELECT MAX(earlier.ordinal)
+        FROM potential_transaction earlier
+        WHERE earlier.date = potential_transaction.date
+            AND earlier.amount = potential_transaction.amount
+            AND earlier.description_id = potential_transaction.description_id
+            AND earlier.id < :first_id
+    ), 0) + (
+        SELECT COUNT(*)
+        FROM potential_transaction batch
+        WHERE batch.date = potential_transaction.date
+            AND batch.amount = potential_transaction.amount
+            AND batch.description_id = potential_transaction.description_id
+            AND batch.id BETWEEN :first_id AND potential_transaction.id
     )
-    sql_connection.commit()
+WHERE id >= :first_id;
+"""
+    fingerprint_statement = """
+UPDATE potential_transaction
+SET fingerprint = transaction_fingerprint(date, amount, description_id, ordinal)
+WHERE id >= :first_id;
+"""
+    parameters = {"first_id": first_id}
+    sql_connection.execute(statement, parameters)
+    sql_connection.execute(fingerprint_statement, parameters)
+
+
+def insert_entries(
+    data_entries: Iterable[Optional[DataEntry]],
+    sql_connection: Connection,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Stream entries into the potential table, at most batch_size at a time.
+
+    Args:
+        data_entries - any iterable of entries, typically a generator
+        sql_connection - an active sql connection
+        batch_size - the most entries held in memory at once
+    Returns:
+        The number of entries staged.
+    """
+    if data_entries is None:
+        raise TypeError()
+
+    descriptions = DescriptionCache(sql_connection)
+    staged = 0
+    for batch in _batches(data_entries, batch_size):
+        insert_potential_transactions(batch, sql_connection, descriptions)
+        staged += len(batch)
+    return staged
+
+
+def _iter_cursor(cursor: Cursor, batch_size: int) -> Iterator[tuple]:
+    while rows := cursor.fetchmany(batch_size):
+        yield from rows
+
+
+def iter_duplicate_records(
+    sql_connection: Connection, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[tuple]:
+    """Stream the staged transactions that are already saved, batch_size rows at
+    a time. Works with either staging mode, a view in the database file would
+    only ever see the table on disk.
+
+    Returns:
+        (date, amount, description, potential id) ordered by date then amount
+    """
+    statement = """
+SELECT pt.date, pt.amount / 100.0, d.name, pt.id
+FROM potential_transaction pt
+JOIN description d ON d.id = pt.description_id
+WHERE EXISTS (
+    SELECT 1 FROM bank_transaction bt
+    WHERE bt.date = pt.date
+        AND bt.amount = pt.amount
+        AND bt.description_id = pt.description_id
+)
+ORDER BY pt.date, pt.amount, pt.id;
+"""
+    cursor = sql_connection.execute(statement)
+    return _iter_cursor(cursor, batch_size)
 
 
 def get_duplicate_records(sql_connection: Connection) -> list[tuple]:
-    # TODO: return < 100k at once or some big number to prevent issues later
-    # TODO: yield instead?
-    statement = "SELECT * FROM duplicate_view;"
-    cursor = sql_connection.cursor()
-    c = cursor.execute(statement)
-    return c.fetchall()
+    return list(iter_duplicate_records(sql_connection))
 
 
 def get_potential_duplicates(sql_connection: Connection) -> list[tuple]:
     statement = """
-
-SELECT pt.id, date, amount, name, description_id,
-    (SELECT COUNT(*)
-     FROM bank_transaction bt
-     WHERE bt.date = pt.date
-       AND bt.amount = pt.amount
-       AND bt.description_id = pt.description_id) AS bank_count
-FROM potential_transaction pt
-join description d on d.id=pt.description_id
-WHERE (
-    (date, amount, description_id) IN (
-    SELECT date, amount, description_id
+WITH flagged AS (
+    SELECT pt.id, pt.date, pt.amount, pt.description_id
+    FROM potential_transaction pt
+    WHERE pt.ordinal > 1
+        OR transaction_fingerprint(pt.date, pt.amount, pt.description_id, 2)
+            IN (SELECT fingerprint FROM potential_transaction)
+        OR transaction_fingerprint(pt.date, pt.amount, pt.description_id, 1)
+            IN (SELECT fingerprint FROM bank_transaction)
+),
+saved AS (
+    -- Saved copies are numbered 1 to n, so the highest ordinal is the count
+    SELECT bt.date, bt.amount, bt.description_id, MAX(bt.ordinal) AS bank_count
+    FROM (SELECT DISTINCT date, amount, description_id FROM flagged) keys
+    JOIN bank_transaction bt
+        ON bt.date = keys.date
+        AND bt.amount = keys.amount
+        AND bt.description_id = keys.description_id
+    GROUP BY bt.date, bt.amount, bt.description_id
+)
+SELECT f.id, f.date, f.amount / 100.0 AS amount, d.name, f.description_id,
+    COALESCE(s.bank_count, 0) AS bank_count
+FROM flagged f
+JOIN description d ON d.id = f.description_id
+LEFT JOIN saved s
+    ON s.date = f.date
+    AND s.amount = f.amount
+    AND s.description_id = f.description_id
+ORDER BY f.date, f.amount
+"""
+    with get_profiler().stage("duplicates"):
+        return sql_connection.execute(statement).fetchall()
+
+
+def iter_duplicate_groups(
+    sql_connection: Connection, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[DuplicateGroup]:
+    """Get every group of staged transactions that is repeated in the potential
+    table or already saved, aggregated in a single pass over each table.
+
+    Args:
+        sql_connection - an active sql connection
+        batch_size - the number of groups fetched from sqlite at a time
+    Returns:
+        The groups ordered by date then amount. details holds the date, amount,
+        description and description id of the group.
+    """
+    statement = """
+WITH staged AS (
+    SELECT date, amount, description_id,
+        COUNT(*) AS staged_count,
+        group_concat(id) AS ids
     FROM potential_transaction
     GROUP BY date, amount, description_id
-    HAVING COUNT(*) > 1)
-    OR EXISTS (
-        SELECT 1
-        FROM bank_transaction bt
-        WHERE bt.date = pt.date
-          AND bt.amount = pt.amount
-          AND bt.description_id = pt.description_id
-    )
+),
+saved AS (
+    SELECT bt.date, bt.amount, bt.description_id, COUNT(*) AS saved_count
+    FROM staged s
+    JOIN bank_transaction bt
+        ON bt.date = s.date
+        AND bt.amount = s.amount
+        AND bt.description_id = s.description_id
+    GROUP BY bt.date, bt.amount, bt.description_id
 )
-ORDER BY date, amount
+SELECT s.ids, s.staged_count, COALESCE(sv.saved_count, 0),
+    s.date, s.amount / 100.0, d.name, s.description_id
+FROM staged s
+JOIN description d ON d.id = s.description_id
+LEFT JOIN saved sv
+    ON sv.date = s.date
+    AND sv.amount = s.amount
+    AND sv.description_id = s.description_id
+WHERE s.staged_count > 1 OR sv.saved_count IS NOT NULL
+ORDER BY s.date, s.amount
 """
-    cursor = sql_connection.cursor()
-    c = cursor.execute(statement)
-    return c.fetchall()
+    with get_profiler().stage("duplicates"):
+        cursor = sql_connection.execute(statement)
+    return (
+        DuplicateGroup(
+            sorted(int(id) for id in ids.split(",")),
+            staged_count,
+            saved_count,
+            tuple(details),
+        )
+        for ids, staged_count, saved_count, *details in _iter_cursor(cursor, batch_size)
+    )
+
+
+def get_duplicate_groups(sql_connection: Connection) -> list[DuplicateGroup]:
+    return list(iter_duplicate_groups(sql_connection))
+
+
+def resolve_duplicates(sql_connection: Connection, policy: str) -> None:
+    """Resolve every staged duplicate at once with one of DUPLICATE_POLICIES:
+
+        keep-all - keep every staged copy
+        keep-one - keep at most one copy, and none if it's already saved
+        keep-max-of-file-count - keep enough copies that the database ends up
+            with as many as the larger of the saved and staged counts
+        trust-db - keep no copies of anything already saved
+
+    Args:
+        sql_connection - an active sql connection
+        policy - name of the policy to apply
+
+    Raises:
+        ValueError - policy isn't one of DUPLICATE_POLICIES
+    """
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"{policy} is not a duplicate policy.")
+    condition = DUPLICATE_POLICIES[policy]
+    profiler = get_profiler()
+    with profiler.stage("duplicates"):
+        if condition is not None:
+            cursor = sql_connection.execute(
+                f"DELETE FROM potential_transaction WHERE {condition};"
+            )
+            profiler.count("duplicates", rejected=cursor.rowcount)
+        sql_connection.commit()
+
+
+def skip_duplicates(sql_connection: Connection) -> None:
+    resolve_duplicates(sql_connection, "keep-one")
 
 
 def preserve_potential(sql_connection: Connection) -> None:
-    statement = (
-        "INSERT INTO bank_transaction (date, amount, description_id) SELECT date,"
-        " amount, description_id FROM potential_transaction;"
-    )
-    sql_connection.execute(statement)
-    sql_connection.commit()
+    """Save the staged transactions. Copies of a transaction already saved are
+    numbered on from the saved ones so every fingerprint stays unique.
+    """
+    statement = """
+INSERT INTO bank_transaction (date, amount, description_id, ordinal, fingerprint)
+SELECT date, amount, description_id, n,
+    transaction_fingerprint(date, amount, description_id, n)
+FROM (
+    SELECT pt.date, pt.amount, pt.description_id,
+        (
+            SELECT COUNT(*)
+            FROM potential_transaction earlier
+            WHERE earlier.date = pt.date
+                AND earlier.amount = pt.amount
+                AND earlier.description_id = pt.description_id
+                AND earlier.id <= pt.id
+        ) + COALESCE((
+            SELECT MAX(bt.ordinal)
+            FROM bank_transaction bt
+            WHERE bt.date = pt.date
+                AND bt.amount = pt.amount
+                AND bt.description_id = pt.description_id
+        ), 0) AS n
+    FROM potential_transaction pt
+    ORDER BY pt.id
+);
+"""
+    summary_statement = """
+INSERT INTO monthly_summary (month, description_id, total, transaction_count)
+SELECT substr(date, 1, 7), description_id, SUM(amount), COUNT(*)
+FROM potential_transaction
+GROUP BY substr(date, 1, 7), description_id
+ON CONFLICT (month, description_id) DO UPDATE SET
+    total = total + excluded.total,
+    transaction_count = transaction_count + excluded.transaction_count;
+"""
+    profiler = get_profiler()
+    with profiler.stage("preserve"):
+        cursor = sql_connection.execute(statement)
+        profiler.count("preserve", rows=cursor.rowcount)
+        sql_connection.execute(summary_statement)
+        sql_connection.commit()
 
 
 def clear_potential(sql_connection: Connection) -> None:
@@ -105,12 +641,31 @@ def clear_potential(sql_connection: Connection) -> None:
     sql_connection.execute(statement)
 
 
-def remove_potential(sql_connection: Connection, entries: list[int]) -> None:
-    cursor = sql_connection.cursor()
-    placeholders = ",".join("?" * len(entries))  # Create a placeholder for each ID
-    del_statement = f"DELETE FROM potential_transaction WHERE id IN ({placeholders})"
-    cursor.execute(del_statement, tuple(entries))
-    sql_connection.commit()
+def remove_potential(sql_connection: Connection, ids: Iterable[int]) -> None:
+    """Delete staged transactions by id. The ids are streamed into a TEMP table
+    and removed with one join, so there's no limit on how many there are.
+
+    Args:
+        sql_connection - an active sql connection
+        ids - potential_transaction ids, any iterable including generators
+    """
+    profiler = get_profiler()
+    with profiler.stage("remove"):
+        sql_connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS removed_id (id INTEGER PRIMARY KEY);"
+        )
+        sql_connection.execute("DELETE FROM temp.removed_id;")
+        sql_connection.executemany(
+            "INSERT OR IGNORE INTO temp.removed_id(id) VALUES (?);",
+            ((id,) for id in ids),
+        )
+        cursor = sql_connection.execute(
+            "DELETE FROM potential_transaction WHERE id IN"
+            " (SELECT id FROM temp.removed_id);"
+        )
+        profiler.count("remove", rejected=cursor.rowcount)
+        sql_connection.execute("DELETE FROM temp.removed_id;")
+        sql_connection.commit()
 
 
 def get_descriptions_missing_alias(sql_connection: Connection) -> list[tuple[str]]:
@@ -143,6 +698,9 @@ def get_description_id_by_name_like(
 
 
 def insert_alias(sql_connection: Connection, id_list: list[int], alias_name: str):
+    """Alias descriptions that don't have one yet. Triggers copy the alias to
+    description.display_name.
+    """
     statement = (
         "INSERT OR IGNORE INTO description_alias(description_id, name) VALUES (?, ?);"
     )
@@ -153,6 +711,9 @@ def insert_alias(sql_connection: Connection, id_list: list[int], alias_name: str
 
 
 def replace_alias(sql_connection: Connection, id_list: list[int], alias_name: str):
+    """Alias descriptions, replacing any existing alias. Triggers copy the alias
+    to description.display_name.
+    """
     statement = (
         "INSERT OR REPLACE INTO description_alias(description_id, name) VALUES (?, ?);"
     )
@@ -162,24 +723,90 @@ def replace_alias(sql_connection: Connection, id_list: list[int], alias_name: st
     sql_connection.commit()
 
 
-def search(
+def apply_alias_rules(
+    sql_connection: Connection,
+    rules: AliasRules,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Alias descriptions by the first rule they match. Only descriptions added
+    since the rules were last applied are checked, unless the rules changed, in
+    which case every description is checked again and aliases from the old rules
+    are replaced. Aliases made by hand are left alone.
+
+    Args:
+        sql_connection - an active sql connection
+        rules - the alias rules, in order
+        batch_size - the number of descriptions read from sqlite at a time
+    Returns:
+        The number of descriptions aliased
+    """
+    rules_hash = rules.rules_hash
+    state = sql_connection.execute(
+        "SELECT rules_hash, last_description_id FROM alias_rule_state;"
+    ).fetchone()
+    if state is not None and state[0] == rules_hash:
+        last_id = state[1]
+    else:
+        last_id = 0
+        sql_connection.execute("DELETE FROM description_alias WHERE from_rule = 1;")
+
+    cursor = sql_connection.execute(
+        "SELECT id, name FROM description WHERE id > ? ORDER BY id;", (last_id,)
+    )
+    aliases = []
+    for description_id, name in _iter_cursor(cursor, batch_size):
+        last_id = description_id
+        alias_name = rules.match(name)
+        if alias_name is not None:
+            aliases.append((description_id, alias_name))
+
+    cursor = sql_connection.executemany(
+        "INSERT INTO description_alias(description_id, name, from_rule)"
+        " VALUES (?, ?, 1) ON CONFLICT(description_id) DO UPDATE"
+        " SET name = excluded.name WHERE description_alias.from_rule = 1;",
+        aliases,
+    )
+    sql_connection.execute(
+        "INSERT OR REPLACE INTO alias_rule_state(id, rules_hash, last_description_id)"
+        " VALUES (1, ?, ?);",
+        (rules_hash, last_id),
+    )
+    sql_connection.commit()
+    return cursor.rowcount
+
+
+def iter_search(
     sql_connection: Connection,
     start_date: Optional[str],
     end_date: Optional[str],
     filter: Optional[str],
-):
-    cursor = sql_connection.cursor()
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    match: Optional[str] = None,
+) -> Iterator[tuple]:
+    """Stream saved transactions ordered by date, batch_size rows at a time.
+
+    Args:
+        sql_connection - an active sql connection
+        start_date - the earliest date to include, YYYY-MM-DD
+        end_date - the latest date to include, YYYY-MM-DD
+        filter - only include this description or alias
+        batch_size - the number of rows fetched from sqlite at a time
+        match - only include descriptions matching this FTS5 query, checked
+            against the description, extra description and alias
+    Returns:
+        (date, amount, description) for each transaction
+    Raises:
+        InvalidMatchQuery - match isn't a valid FTS5 query
+    """
     statement = """
 SELECT
     bt.date AS transaction_date,
-    bt.amount AS transaction_amount,
-    COALESCE(da.name, d.name) AS transaction_description
+    bt.amount / 100.0 AS transaction_amount,
+    d.display_name AS transaction_description
 FROM
     bank_transaction bt
-LEFT JOIN
+JOIN
     description d ON bt.description_id = d.id
-LEFT JOIN
-    description_alias da ON bt.description_id = da.description_id
 """
     conditions = []
     parameters = []
@@ -193,13 +820,129 @@ LEFT JOIN
         parameters.append(end_date)
 
     if filter:
-        conditions.append("(d.name = ? OR da.name = ?)")
+        conditions.append("(d.display_name = ? OR d.name = ?)")
         parameters.extend([filter, filter])
 
+    if match:
+        _check_match(sql_connection, match)
+        conditions.append(_MATCH_CONDITION)
+        parameters.append(match)
+
     if conditions:
         statement += "WHERE " + " AND ".join(conditions)
 
-    # Add the ORDER BY clause
-    statement += " ORDER BY bt.date ASC;"
-    cursor.execute(statement, parameters)
-    return cursor.fetchall()
+    # Add the ORDER BY clause, id keeps same day transactions in insert order
+    statement += " ORDER BY bt.date ASC, bt.id ASC;"
+    cursor = sql_connection.execute(statement, parameters)
+    return _iter_cursor(cursor, batch_size)
+
+
+def _check_match(sql_connection: Connection, match: str) -> None:
+    # FTS5 only parses a query once it's run, which for a streamed report can be
+    # halfway through writing it.
+    try:
+        sql_connection.execute(_MATCH_CHECK, (match,)).fetchall()
+    except OperationalError as e:
+        raise InvalidMatchQuery(match, str(e)) from e
+
+
+def search(
+    sql_connection: Connection,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    filter: Optional[str],
+    match: Optional[str] = None,
+):
+    return list(
+        iter_search(
+            sql_connection, start_date, end_date, filter, DEFAULT_BATCH_SIZE, match
+        )
+    )
+
+
+def iter_summary(
+    sql_connection: Connection,
+    group_by: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    filter: Optional[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    match: Optional[str] = None,
+) -> Iterator[tuple]:
+    """Stream totals from the monthly summary table. Dates only narrow the
+    range down to whole months.
+
+    Args:
+        sql_connection - an active sql connection
+        group_by - month, description or alias
+        start_date - include the month of this date onwards, YYYY-MM-DD
+        end_date - include up to the month of this date, YYYY-MM-DD
+        filter - only include this description or alias
+        batch_size - the number of rows fetched from sqlite at a time
+        match - only include descriptions matching this FTS5 query
+    Returns:
+        (key, total amount, transaction count) for each group
+    Raises:
+        ValueError - group_by isn't supported\n
+        InvalidMatchQuery - match isn't a valid FTS5 query
+    """
+    if group_by not in _SUMMARY_KEYS:
+        raise ValueError(f"Can't group a report by {group_by}.")
+
+    key = _SUMMARY_KEYS[group_by]
+    statement = f"""
+SELECT
+    {key} AS summary_key,
+    SUM(ms.total) / 100.0 AS summary_total,
+    SUM(ms.transaction_count) AS summary_count
+FROM
+    monthly_summary ms
+JOIN
+    description d ON ms.description_id = d.id
+"""
+    conditions = []
+    parameters = []
+
+    if start_date:
+        conditions.append("ms.month >= substr(?, 1, 7)")
+        parameters.append(start_date)
+
+    if end_date:
+        conditions.append("ms.month <= substr(?, 1, 7)")
+        parameters.append(end_date)
+
+    if filter:
+        conditions.append("(d.display_name = ? OR d.name = ?)")
+        parameters.extend([filter, filter])
+
+    if match:
+        _check_match(sql_connection, match)
+        conditions.append(_MATCH_CONDITION)
+        parameters.append(match)
+
+    if conditions:
+        statement += "WHERE " + " AND ".join(conditions)
+
+    statement += f" GROUP BY {key} ORDER BY {key} ASC;"
+    cursor = sql_connection.execute(statement, parameters)
+    return _iter_cursor(cursor, batch_size)
+
+
+def get_source_file(sql_connection: Connection, path: str) -> Optional[SourceFile]:
+    statement = (
+        "SELECT path, size, mtime_ns, content_hash, row_offset FROM source_file"
+        " WHERE path=?;"
+    )
+    row = sql_connection.execute(statement, (path,)).fetchone()
+    return None if row is None else SourceFile(*row)
+
+
+def record_source_files(
+    sql_connection: Connection, source_files: Iterable[SourceFile]
+) -> None:
+    statement = (
+        "INSERT OR REPLACE INTO source_file(path, size, mtime_ns, content_hash,"
+        " row_offset) VALUES (?, ?, ?, ?, ?);"
+    )
+    sql_connection.executemany(statement, source_files)
+    sql_connection.commit()
@@ -1,26 +1,18 @@
-from csv import DictReader
+import re
+from csv import DictReader, reader
+from functools import lru_cache
 from io import TextIOWrapper
-from typing import Any
+from typing import Any, Optional
 
-from dateutil.parser import ParserError, parse
+from dateutil.parser import parse, parserinfo
 
-_SQL_KEYS = ["date", "amount", "description", "extra_desc"]
+from banksheets.formats import BankFormat, FormatRegistry
 
-_MAP_CONVERSION = {
-    ("Posted Date", "Reference Number", "Payee", "Address", "Amount"): [
-        _SQL_KEYS[0],
-        None,
-        _SQL_KEYS[2],
-        _SQL_KEYS[3],
-        _SQL_KEYS[1],
-    ],
-    ("Date", "Description", "Amount", "Running Bal."): [
-        _SQL_KEYS[0],
-        _SQL_KEYS[2],
-        _SQL_KEYS[1],
-        None,
-    ],
-}
+# Numeric dates such as 1/1/2023, 01-31-23 or 2023.01.31
+_DATE_PROBE = re.compile(r"\d{1,4}([/.-])\d{1,2}\1\d{1,4}$")
+_DATE_WORDS = parserinfo()
+_WORD = re.compile(r"[^\W\d_]+")
+_DIGIT = re.compile(r"\d")
 
 
 class MissingHeadingMapping(Exception):
@@ -33,74 +25,148 @@ class NoHeaderException(Exception):
         super().__init__("CSV file has no headers to key off of.")
 
 
-class SkipAheadDictReader(DictReader):
-    """
-    Skips over any summary information and return a DictReader with just the
-    transaction data.
+@lru_cache(maxsize=1)
+def _builtin_registry() -> FormatRegistry:
+    return FormatRegistry.builtin()
 
-    raises:
-        NoHeaderException if there aren't anything we detect as a header.
+
+class _HeaderSkipper:
+    """
+    Finds the header row of a bank export and leaves the file positioned on the
+    first row of transaction data.
     """
 
-    def __init__(self, file: TextIOWrapper) -> None:
-        if file is None:
-            raise TypeError("SkipAheadDictReader doesn't accept None objects.")
-        self.file = file
-        headers = self._get_headers()
-        new_headers = self._convert(headers)
-        super().__init__(self.file, new_headers)
+    file: TextIOWrapper
+    registry: FormatRegistry
 
-    def __next__(self) -> dict[Any, str | Any]:
-        d = super().__next__()
-        del d[None]
-        return d
+    def _find_format(self, registry: Optional[FormatRegistry]) -> BankFormat:
+        self.registry = _builtin_registry() if registry is None else registry
+        headers = self._get_headers()
+        bank_format = self.registry.find(headers)
+        if bank_format is None:
+            raise MissingHeadingMapping()
+        return bank_format
 
-    def _get_headers(self) -> tuple[int, list[str]]:
+    def _get_headers(self) -> list[str]:
         position = 0
         found = False
         line = self.file.readline()
         prev_row_segments = []
         while line != "" and not found:
             split_line = line.split(",")
-            if len(split_line) > 0:
-                first_segment_is_date = SkipAheadDictReader._contains_date(split_line)
-                if first_segment_is_date:
-                    if prev_row_segments == []:
-                        raise NoHeaderException()
-                    else:
-                        found = True
+            if split_line in self.registry:
+                # A known header, the data starts on the next line.
+                position = self.file.tell()
+                prev_row_segments = split_line
+                found = True
+            elif _HeaderSkipper._contains_date(split_line):
+                if prev_row_segments == []:
+                    raise NoHeaderException()
                 else:
-                    position = self.file.tell()
-                    prev_row_segments = split_line
+                    found = True
+            else:
+                position = self.file.tell()
+                prev_row_segments = split_line
 
-                if not found:
-                    line = self.file.readline()
+            if not found:
+                line = self.file.readline()
 
         self.file.seek(position)
         return prev_row_segments
 
     @staticmethod
     def _contains_date(args: list[str]) -> bool:
+        text = args[0].strip().strip('"')
+        if _DATE_PROBE.match(text):
+            return True
+        if not _DIGIT.search(text):
+            return False
+        if not all(map(_HeaderSkipper._is_date_word, _WORD.findall(text))):
+            return False
+        # Only unusual formats get as far as the slow dateutil parser.
         try:
-            text = args[0].strip('"')
             parse(text)
             return True
-        except ValueError:
-            return False
-        except ParserError as e:
-            print(e)
+        except (ValueError, OverflowError):
             return False
 
     @staticmethod
-    def _convert(header_row: list[str]) -> list[str]:
-        key = SkipAheadDictReader._get_key(header_row)
-        if key in _MAP_CONVERSION:
-            return _MAP_CONVERSION[key]
-        else:
-            raise MissingHeadingMapping()
+    @lru_cache(maxsize=1024)
+    def _is_date_word(word: str) -> bool:
+        """Whether dateutil could accept the word in a date without fuzzy mode."""
+        return (
+            _DATE_WORDS.jump(word)
+            or _DATE_WORDS.pertain(word)
+            or _DATE_WORDS.utczone(word)
+            or _DATE_WORDS.month(word) is not None
+            or _DATE_WORDS.weekday(word) is not None
+            or _DATE_WORDS.hms(word) is not None
+            or _DATE_WORDS.ampm(word) is not None
+            # dateutil takes short upper case words as time zone names
+            or (len(word) <= 5 and word.isupper())
+        )
+
+
+class SkipAheadDictReader(_HeaderSkipper, DictReader):
+    """
+    Skips over any summary information and return a DictReader with just the
+    transaction data.
 
-    @staticmethod
-    def _get_key(header_row: list[str]) -> tuple[str]:
-        new_headers = header_row
-        new_headers[-1] = new_headers[-1].strip()
-        return tuple(new_headers)
+    raises:
+        NoHeaderException if there aren't anything we detect as a header.
+        MissingHeadingMapping if the headers aren't a registered bank format.
+    """
+
+    def __init__(
+        self, file: TextIOWrapper, registry: Optional[FormatRegistry] = None
+    ) -> None:
+        if file is None:
+            raise TypeError("SkipAheadDictReader doesn't accept None objects.")
+        self.file = file
+        self.format = self._find_format(registry)
+        super().__init__(self.file, self.format.fieldnames)
+
+    def __next__(self) -> dict[Any, str | Any]:
+        d = super().__next__()
+        d.pop(None, None)
+        return d
+
+
+class SkipAheadReader(_HeaderSkipper):
+    """
+    Skips over any summary information like SkipAheadDictReader, then yields each
+    transaction as a (date, amount, description[, extra_desc]) tuple picked
+    straight out of the csv row by the bank format's compiled mapper. Blank and
+    short rows are skipped. Rows before the byte offset start are skipped too.
+
+    raises:
+        NoHeaderException if there aren't anything we detect as a header.
+        MissingHeadingMapping if the headers aren't a registered bank format.
+    """
+
+    def __init__(
+        self,
+        file: TextIOWrapper,
+        registry: Optional[FormatRegistry] = None,
+        start: int = 0,
+    ) -> None:
+        if file is None:
+            raise TypeError("SkipAheadReader doesn't accept None objects.")
+        self.file = file
+        self.format = self._find_format(registry)
+        if start > self.file.tell():
+            # Resume an append-only export, start is a byte offset on a line end.
+            self.file.seek(start)
+        self._mapper = self.format.compile()
+        self._reader = reader(self.file)
+
+    def __iter__(self) -> "SkipAheadReader":
+        return self
+
+    def __next__(self) -> tuple[str, ...]:
+        for row in self._reader:
+            try:
+                return self._mapper(row)
+            except IndexError:
+                continue
+        raise StopIteration
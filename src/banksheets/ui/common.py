@@ -1,109 +1,390 @@
-import itertools
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
 from pathlib import Path
 from sqlite3 import Connection
+from typing import Generator, Iterable, Iterator, NamedTuple, Optional, Union
 
+from banksheets.batch import TransactionBatch
 from banksheets.entry import DataEntry
-from banksheets.sql_commands import get_potential_duplicates
+from banksheets.formats import FormatRegistry
+from banksheets.profiling import (
+    StageStats,
+    disable_profiling,
+    enable_profiling,
+    get_profiler,
+)
+from banksheets.sql_commands import SourceFile, get_source_file
 from banksheets.transaction_reader import (
     MissingHeadingMapping,
     NoHeaderException,
-    SkipAheadDictReader,
+    SkipAheadReader,
 )
 
 
-def _get_data_from_folder(folder: Path) -> list[dict[str, str]]:
-    """Search a directory for csv files and return the rows of data.
+class PlannedSource(NamedTuple):
+    """A csv file to import, read from the byte offset start up to the
+    source_file row_offset.
+    """
+
+    source_file: SourceFile
+    start: int
+
+
+# A file to read, with the byte offsets to start reading rows at and to stop at,
+# the end of the file if None
+_FileRange = tuple[Path, int, Optional[int]]
+
+
+class _BoundedFile(io.RawIOBase):
+    """A binary file that ends at the byte offset end, so rows appended after a
+    file was planned aren't read.
+    """
+
+    def __init__(self, raw: io.RawIOBase, end: int) -> None:
+        super().__init__()
+        self._raw = raw
+        self._end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._end - self._raw.tell())
+        if size <= 0:
+            return 0
+        return self._raw.readinto(memoryview(buffer)[:size])
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def _open_csv(path: Path, end: Optional[int] = None) -> io.TextIOWrapper:
+    if end is None:
+        return open(path, newline="")
+    bounded = _BoundedFile(io.FileIO(path), end)
+    return io.TextIOWrapper(io.BufferedReader(bounded), newline="")
+
+
+def _csv_files(path: Path) -> list[Path]:
+    return sorted(path.glob("*.csv")) if path.is_dir() else [path]
+
+
+def _iter_files(
+    files: Iterable[_FileRange],
+    registry: Optional[FormatRegistry] = None,
+    parsed: Optional[list[Path]] = None,
+) -> Iterator[tuple[str, ...]]:
+    """Read csv files one after another and yield the rows of data.
 
     Args:
-        folder - the source folder
+        files - each file with the byte offsets to read rows between
+        registry - the bank formats to recognise, the built-in ones if None
+        parsed - if given, each file with a recognised header is appended
     Returns:
-        The transaction data
+        The transaction data, in the order of files
+    """
+    for file, start, end in files:
+        recognised = yield from _iter_file(file, registry, start, end)
+        if recognised and parsed is not None:
+            parsed.append(file)
+
+
+def _iter_files_parallel(
+    files: Iterable[_FileRange],
+    jobs: int,
+    registry: Optional[FormatRegistry] = None,
+    parsed: Optional[list[Path]] = None,
+) -> Iterator[Optional[DataEntry]]:
+    """Parse csv files in worker processes. Files are yielded in the order given
+    no matter which worker finishes first.
+
+    Args:
+        files - each file with the byte offsets to read rows between
+        jobs - the number of worker processes
+        registry - the bank formats to recognise, the built-in ones if None
+        parsed - if given, each file with a recognised header is appended
+    Returns:
+        The converted transaction data
     """
-    transactions = []
-    for file in folder.glob("*.csv"):
-        transactions.extend(_read_file(file))
-    return transactions
 
+    profiler = get_profiler()
+
+    def finish(file: Path, future) -> Iterator[Optional[DataEntry]]:
+        entries, recognised, stages = future.result()
+        profiler.merge(stages)
+        yield from entries
+        if recognised and parsed is not None:
+            parsed.append(file)
 
-def _read_file(path: Path) -> list[dict[str, str]]:
-    """Try to read a csv file and return the data inside. Attempts to ignore none
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for file, start, end in files:
+            future = executor.submit(
+                _parse_file, file, registry, start, end, profiler.enabled
+            )
+            pending.append((file, future))
+            # only keep a couple of parsed files per worker waiting on the writer
+            if len(pending) > jobs * 2:
+                yield from finish(*pending.popleft())
+        while pending:
+            yield from finish(*pending.popleft())
+
+
+def _parse_file(
+    path: Path,
+    registry: Optional[FormatRegistry] = None,
+    start: int = 0,
+    end: Optional[int] = None,
+    profile: bool = False,
+) -> tuple[list[Optional[DataEntry]], bool, dict[str, StageStats]]:
+    """Read and convert a single csv file. This is the unit of work handed to
+    worker processes, which profile into their own Profiler.
+
+    Args:
+        path - the source file
+        registry - the bank formats to recognise, the built-in ones if None
+        start - the byte offset to start reading rows at
+        end - the byte offset to stop reading at, the end of the file if None
+        profile - collect stage stats for the parent to merge
+    Returns:
+        The converted transaction data, whether the header was recognised and
+        the stage stats collected
+    """
+    profiler = enable_profiling() if profile else disable_profiling()
+    parsed = []
+    rows = _iter_files([(path, start, end)], registry, parsed)
+    entries = list(DataEntry.from_tuples(rows))
+    return entries, bool(parsed), profiler.stages
+
+
+def _iter_file(
+    path: Path,
+    registry: Optional[FormatRegistry] = None,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Generator[tuple[str, ...], None, bool]:
+    """Try to read a csv file and yield the data inside. Attempts to ignore none
     transaction data.
 
     Args:
         path - the source file
+        registry - the bank formats to recognise, the built-in ones if None
+        start - the byte offset to start reading rows at
+        end - the byte offset to stop reading at, the end of the file if None
     Returns:
-        The transaction data.
+        The transaction data as (date, amount, description[, extra_desc]), then
+        whether the header was recognised.
     """
-    with open(path) as f:
+    with _open_csv(path, end) as f:
         try:
-            reader = SkipAheadDictReader(f)
-            return list(reader)
+            with get_profiler().stage("headers"):
+                reader = SkipAheadReader(f, registry, start)
         except (NoHeaderException, MissingHeadingMapping):
             print(f"Problem parsing: {path.name}")
-    return []
+            get_profiler().count("headers", rejected=1)
+            return False
+        get_profiler().count("headers", rows=1)
+        yield from reader
+    return True
 
 
-def convert_csv_data_to_dataentry(items: list[dict[str, str]]) -> list[DataEntry]:
-    """Convert transaction data into dataentry
+def _iter_entries(
+    files: list[_FileRange],
+    jobs: int = 1,
+    registry: Optional[FormatRegistry] = None,
+    parsed: Optional[list[Path]] = None,
+) -> Iterator[Optional[DataEntry]]:
+    if jobs > 1 and len(files) > 1:
+        entries = _iter_files_parallel(files, jobs, registry, parsed)
+    else:
+        entries = DataEntry.from_tuples(_iter_files(files, registry, parsed))
+    # With workers, parse time is the time spent waiting on them.
+    return get_profiler().iterate("parse", entries)
+
+
+def _hash_file(path: Path, prefix_length: int) -> tuple[str, Optional[str], int]:
+    """Hash a file and the first prefix_length bytes of it in one read.
+
+    Returns:
+        The hash of the whole file and of the prefix, None if the file is
+        shorter than prefix_length, and the number of bytes hashed.
+    """
+    hasher = sha256()
+    prefix_hash = None
+    read = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            if read <= prefix_length < read + len(chunk):
+                hasher.update(chunk[: prefix_length - read])
+                prefix_hash = hasher.copy().hexdigest()
+                hasher.update(chunk[prefix_length - read :])
+            else:
+                hasher.update(chunk)
+            read += len(chunk)
+    if read == prefix_length:
+        prefix_hash = hasher.hexdigest()
+    return hasher.hexdigest(), prefix_hash, read
+
+
+def plan_sources(
+    path: Path, db: Connection, reimport: bool = False
+) -> list[PlannedSource]:
+    """Work out which csv files under path need importing, using the ledger of
+    files imported before. Unchanged files are left out and files that only had
+    rows appended are read from where the last import stopped. Each file is only
+    read up to the bytes hashed here, anything appended later is left for the
+    next import.
 
     Args:
-        items - the list of transaction rows from csv
+        path - the source location
+        db - an active sql connection
+        reimport - read every file from the start regardless of the ledger
     Returns:
-        The list of dataentries
+        The files to import. Once saved, pass the source_file of the ones
+        iter_sources could parse to record_source_files.
     """
-    if items is not None:
+    return plan_files(_csv_files(path), db, reimport)
 
-        def create(item: dict[str, str]) -> DataEntry:
-            try:
-                return DataEntry(**item)
-            except ValueError:
-                pass
 
-        converted = map(create, items)
-        return list(converted)
-    else:
-        return []
+def plan_files(
+    csv_files: Iterable[Path], db: Connection, reimport: bool = False
+) -> list[PlannedSource]:
+    """plan_sources for a given list of csv files."""
+    planned = []
+    for file in csv_files:
+        stat = file.stat()
+        key = str(file.resolve())
+        previous = None if reimport else get_source_file(db, key)
+        if (
+            previous is not None
+            and previous.size == stat.st_size
+            and previous.mtime_ns == stat.st_mtime_ns
+        ):
+            continue
+
+        prefix_length = 0 if previous is None else previous.row_offset
+        content_hash, prefix_hash, length = _hash_file(file, prefix_length)
+        start = 0
+        if previous is not None and prefix_hash == previous.content_hash:
+            start = previous.row_offset
 
+        source_file = SourceFile(key, length, stat.st_mtime_ns, content_hash, length)
+        planned.append(PlannedSource(source_file, start))
+    return planned
 
-def get_duplicate_groups(db: Connection) -> list[list[int], int, tuple]:
-    """Get information about all the duplicates currently in the potential table.
+
+def iter_sources(
+    sources: Iterable[PlannedSource],
+    jobs: int = 1,
+    registry: Optional[FormatRegistry] = None,
+    parsed: Optional[list[SourceFile]] = None,
+) -> Iterator[Optional[DataEntry]]:
+    """Stream the transaction data of planned sources, see plan_sources.
 
     Args:
-        db - an active sql connection
+        sources - the files to read
+        jobs - the number of processes used to parse the files
+        registry - the bank formats to recognise, the built-in ones if None
+        parsed - if given, the source_file of each source with a recognised
+            header is appended once every row is read, these are the ones to
+            pass to record_source_files
     Returns:
-        A list with items that are present more than once. Each item:
-            0 - the list of ids with duplicate info in potential.\n
-            1 - the number of items already saved to disk.\n
-            2 - a tuple with the transaction details.
+        The transaction data
     """
-    data = get_potential_duplicates(db)
-    grouped_data = []
-    for key, group in itertools.groupby(data, key=lambda x: (x[1], x[2], x[3], x[4])):
-        potential_ids = []
-        saved_count = 0
-        for section in group:
-            potential_ids.append(section[0])
-            saved_count = section[5]
+    by_path = {Path(source.source_file.path): source for source in sources}
+    files = [
+        (path, source.start, source.source_file.row_offset)
+        for path, source in by_path.items()
+    ]
+    if parsed is None:
+        return _iter_entries(files, jobs, registry)
+    return _collect_parsed(files, jobs, registry, by_path, parsed)
 
-        grouped_data.append([potential_ids, saved_count, key])
 
-    return grouped_data
+def _collect_parsed(
+    files: list[_FileRange],
+    jobs: int,
+    registry: Optional[FormatRegistry],
+    by_path: dict[Path, PlannedSource],
+    parsed: list[SourceFile],
+) -> Iterator[Optional[DataEntry]]:
+    paths = []
+    yield from _iter_entries(files, jobs, registry, paths)
+    parsed.extend(by_path[path].source_file for path in paths)
 
 
-def get_data(path: Path) -> list[DataEntry]:
+def iter_dataentries(
+    items: Optional[Iterable[dict[str, str]]],
+) -> Iterator[Optional[DataEntry]]:
+    """Lazily convert transaction data into dataentry. Rows that can't be parsed
+    become None.
+
+    Args:
+        items - the transaction rows from csv
+    Returns:
+        The dataentries
+    """
+    if items is None:
+        return iter(())
+
+    return DataEntry.from_rows(items)
+
+
+def convert_csv_data_to_dataentry(items: list[dict[str, str]]) -> list[DataEntry]:
+    """Convert transaction data into dataentry
+
+    Args:
+        items - the list of transaction rows from csv
+    Returns:
+        The list of dataentries
+    """
+    return list(iter_dataentries(items))
+
+
+def iter_data(
+    path: Path, jobs: int = 1, registry: Optional[FormatRegistry] = None
+) -> Iterator[Optional[DataEntry]]:
+    """Open the path and stream the transaction data without holding it all in
+    memory.
+
+    Args:
+        path - the source location
+        jobs - the number of processes used to parse a directory
+        registry - the bank formats to recognise, the built-in ones if None
+    Returns:
+        The transaction data
+    """
+    files = [(file, 0, None) for file in _csv_files(path)]
+    return _iter_entries(files, jobs, registry)
+
+
+def get_data(
+    path: Path, columnar: bool = False, registry: Optional[FormatRegistry] = None
+) -> Union[list[DataEntry], TransactionBatch]:
     """Open the path and return the transaction data
 
     Args:
         path - the source location
+        columnar - return a compact TransactionBatch instead of a list
+        registry - the bank formats to recognise, the built-in ones if None
     Returns:
         The transaction data
     """
-    transaction_data = None
-    if path.is_dir():
-        transaction_data = _get_data_from_folder(path)
-    else:
-        transaction_data = _read_file(path)
-    return convert_csv_data_to_dataentry(transaction_data)
+    if columnar:
+        return TransactionBatch.from_entries(iter_data(path, registry=registry))
+    return list(iter_data(path, registry=registry))
 
 
 def check_and_convert_source(path: str) -> Path:
@@ -150,3 +431,20 @@ def convert_output(path: str):
         if output_path.is_dir():
             output_path = output_path / "output.db"
     return output_path
+
+
+def load_formats(paths: Iterable[str]) -> FormatRegistry:
+    """Build a registry of the built-in bank formats plus the ones in paths.
+
+    Args:
+        paths - JSON or TOML bank format files
+    Returns:
+        The registry
+    Raises:
+        ValueError - a file isn't JSON or TOML\n
+        InvalidBankFormat - a format in a file is malformed
+    """
+    registry = FormatRegistry.builtin()
+    for path in paths:
+        registry.load(Path(path))
+    return registry
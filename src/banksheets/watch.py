@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Callable, Iterable, Optional
+
+from banksheets.aliases import AliasRules
+from banksheets.formats import FormatRegistry
+from banksheets.sql_commands import (
+    DEFAULT_BATCH_SIZE,
+    IngestSession,
+    apply_alias_rules,
+    clear_potential,
+    insert_entries,
+    preserve_potential,
+    record_source_files,
+    resolve_duplicates,
+)
+from banksheets.ui.common import PlannedSource, iter_sources, plan_files
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pip install banksheets[watch]
+    Observer = None
+
+_log = logging.getLogger(__name__)
+
+
+def ingest(
+    db: Connection,
+    sources: Iterable[PlannedSource],
+    registry: Optional[FormatRegistry] = None,
+    policy: str = "keep-one",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    staging: str = "memory",
+    alias_rules: Optional[AliasRules] = None,
+) -> int:
+    """Import planned sources in one IngestSession without asking about
+    duplicates.
+
+    Args:
+        db - an active sql connection
+        sources - the files to import, see plan_sources
+        registry - the bank formats to recognise, the built-in ones if None
+        policy - how duplicates are resolved, one of DUPLICATE_POLICIES
+        batch_size - the most entries held in memory at once
+        staging - where transactions are staged, disk or memory
+        alias_rules - rules applied to new descriptions, if any
+    Returns:
+        The number of transactions read
+    """
+    parsed = []
+    with IngestSession(db, staging=staging):
+        entries = iter_sources(sources, 1, registry, parsed)
+        staged = insert_entries(entries, db, batch_size)
+        resolve_duplicates(db, policy)
+        preserve_potential(db)
+        clear_potential(db)
+        record_source_files(db, parsed)
+        if alias_rules is not None:
+            apply_alias_rules(db, alias_rules, batch_size)
+    return staged
+
+
+class Watcher:
+    """
+    Keeps a connection and format registry open and imports csv files as they
+    appear or change in a folder. The folder is polled every interval seconds.
+    With watchdog installed, file system events wake the watcher straight away.
+
+    A file is only imported once it hasn't been modified for settle seconds, so
+    half written files are left for the next poll. The import ledger decides
+    what gets read, files that only grew are read from where the last import
+    stopped. Errors are logged and the files involved are tried again on the
+    next poll, the watcher keeps going.
+
+    Args:
+        path - the folder to watch
+        db - an active sql connection, only used from the watching thread
+        registry - the bank formats to recognise, the built-in ones if None
+        policy - how duplicates are resolved, one of DUPLICATE_POLICIES
+        interval - seconds between polls
+        settle - seconds a file has to be left alone before it's imported
+        on_ingest - called with the files and transaction count of each import
+        Other arguments are passed on to ingest.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        db: Connection,
+        registry: Optional[FormatRegistry] = None,
+        policy: str = "keep-one",
+        interval: float = 2.0,
+        settle: float = 1.0,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        staging: str = "memory",
+        alias_rules: Optional[AliasRules] = None,
+        on_ingest: Optional[Callable[[list[Path], int], None]] = None,
+    ) -> None:
+        self.path = Path(path)
+        if not self.path.is_dir():
+            raise NotADirectoryError(f"{path} is not a directory.")
+        self.db = db
+        self.registry = FormatRegistry.builtin() if registry is None else registry
+        self.policy = policy
+        self.interval = interval
+        self.settle = settle
+        self.batch_size = batch_size
+        self.staging = staging
+        self.alias_rules = alias_rules
+        self.on_ingest = on_ingest
+        self._seen: dict[Path, tuple[int, int]] = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def poll(self) -> int:
+        """Import the files that changed since the last poll and have settled.
+
+        Returns:
+            The number of transactions read
+        """
+        now = time.time_ns()
+        changed = {}
+        for file in sorted(self.path.glob("*.csv")):
+            try:
+                stat = file.stat()
+            except OSError as e:
+                _log.warning("Skipping %s: %s", file.name, e)
+                continue
+            key = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(file) == key:
+                continue
+            if now - stat.st_mtime_ns < self.settle * 1e9:
+                continue
+            changed[file] = key
+        if not changed:
+            return 0
+
+        # Only settled files that changed are hashed
+        sources = []
+        ready = {}
+        for file, key in changed.items():
+            try:
+                sources.extend(plan_files([file], self.db))
+            except OSError as e:
+                _log.warning("Skipping %s: %s", file.name, e)
+                continue
+            ready[file] = key
+        count = 0
+        if sources:
+            try:
+                count = ingest(
+                    self.db,
+                    sources,
+                    self.registry,
+                    self.policy,
+                    self.batch_size,
+                    self.staging,
+                    self.alias_rules,
+                )
+            except Exception as e:
+                self.db.rollback()
+                names = ", ".join(
+                    Path(source.source_file.path).name for source in sources
+                )
+                _log.error("Couldn't import %s, trying again next poll: %s", names, e)
+                return 0
+        self._seen.update(ready)
+        if sources and self.on_ingest is not None:
+            self.on_ingest(
+                [Path(planned.source_file.path) for planned in sources], count
+            )
+        return count
+
+    def run(self) -> None:
+        """Poll until stop is called."""
+        observer = self._start_observer()
+        try:
+            while not self._stopped.is_set():
+                self.poll()
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self) -> None:
+        """Stop run after the current poll, safe to call from any thread."""
+        self._stopped.set()
+        self._wake.set()
+
+    def _start_observer(self):
+        if Observer is None:
+            return None
+
+        wake = self._wake
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:
+                if str(event.src_path).endswith(".csv"):
+                    wake.set()
+
+        observer = Observer()
+        observer.schedule(_Handler(), str(self.path), recursive=False)
+        observer.start()
+        return observer
@@ -0,0 +1,294 @@
+import csv
+import json
+import sqlite3
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from itertools import islice
+from pathlib import Path
+from typing import IO, BinaryIO, Iterable, Iterator, NamedTuple, Optional, Sequence
+
+from banksheets.sql_commands import DEFAULT_BATCH_SIZE
+
+# Column kinds, named after the SQLite types they're stored as
+KINDS = ("text", "real", "integer")
+
+COLUMNAR_MAGIC = b"BSCOL1\n"
+# Stands in for the byte length of a NULL text value in the columnar format
+_NULL_LENGTH = 0xFFFFFFFF
+_TYPECODES = {"real": "d", "integer": "q"}
+
+
+class Column(NamedTuple):
+    name: str
+    kind: str
+
+
+SEARCH_COLUMNS = (
+    Column("date", "text"),
+    Column("amount", "real"),
+    Column("description", "text"),
+)
+
+
+def summary_columns(group_by: str) -> tuple[Column, ...]:
+    return (
+        Column(group_by, "text"),
+        Column("total", "real"),
+        Column("count", "integer"),
+    )
+
+
+class ReportWriter(ABC):
+    """
+    Streams report rows to a file, batch_size rows at a time. Use as a context
+    manager, the file is opened on entry and closed on exit.
+
+    Args:
+        path - the file to write, stdout if None and the format allows it
+        columns - the name and kind of each value in a row
+        overwrite - let a writer that deletes path first replace an existing file
+    Raises:
+        ValueError - the format needs a file and path is None
+    """
+
+    binary = False
+    needs_path = False
+    deletes_existing = False
+
+    def __init__(
+        self, path: Optional[Path], columns: Sequence[Column], overwrite: bool = False
+    ) -> None:
+        if path is None and self.needs_path:
+            raise ValueError(f"{type(self).__name__} needs a file to write to.")
+        self.path = path
+        self.columns = tuple(columns)
+        self.overwrite = overwrite
+        self.fp: Optional[IO] = None
+
+    def __enter__(self) -> "ReportWriter":
+        if self.path is None:
+            self.fp = sys.stdout.buffer if self.binary else sys.stdout
+        else:
+            mode = "wb" if self.binary else "w"
+            self.fp = open(self.path, mode, newline=None if self.binary else "")
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.finish()
+        if self.path is not None:
+            self.fp.close()
+        else:
+            self.fp.flush()
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    @abstractmethod
+    def write_batch(self, rows: list[tuple]) -> None:
+        pass
+
+    def write(self, rows: Iterable[tuple], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Write every row, returning how many there were."""
+        count = 0
+        iterator = iter(rows)
+        while batch := list(islice(iterator, batch_size)):
+            self.write_batch(batch)
+            count += len(batch)
+        return count
+
+
+class CsvWriter(ReportWriter):
+    """Comma separated values without a header row, quoted where needed."""
+
+    def start(self) -> None:
+        self._writer = csv.writer(self.fp, lineterminator="\n")
+
+    def write_batch(self, rows: list[tuple]) -> None:
+        self._writer.writerows(rows)
+
+
+class JsonLinesWriter(ReportWriter):
+    """One JSON object per line keyed by column name."""
+
+    def write_batch(self, rows: list[tuple]) -> None:
+        names = [column.name for column in self.columns]
+        self.fp.write("".join(f"{json.dumps(dict(zip(names, row)))}\n" for row in rows))
+
+
+class ColumnarWriter(ReportWriter):
+    """
+    A compact binary format read back with read_columnar. All integers are
+    little endian:
+
+        magic       COLUMNAR_MAGIC
+        schema      u32 byte length, then the JSON list of [name, kind]
+        blocks      until the end of the file, each
+            u32     the number of rows
+            column  for each column in order
+                real, integer   rows f64 or i64 values, NULL real is NaN
+                text            rows u32 byte lengths, 0xFFFFFFFF for NULL,
+                                then the UTF-8 values back to back
+    """
+
+    binary = True
+    needs_path = True
+
+    def start(self) -> None:
+        for column in self.columns:
+            if column.kind not in KINDS:
+                raise ValueError(f"{column.kind} is not a column kind.")
+        schema = json.dumps([list(column) for column in self.columns]).encode()
+        self.fp.write(COLUMNAR_MAGIC)
+        self.fp.write(struct.pack("<I", len(schema)))
+        self.fp.write(schema)
+
+    def write_batch(self, rows: list[tuple]) -> None:
+        parts = [struct.pack("<I", len(rows))]
+        for index, column in enumerate(self.columns):
+            values = [row[index] for row in rows]
+            if column.kind == "text":
+                encoded = [
+                    None if value is None else str(value).encode() for value in values
+                ]
+                lengths = array(
+                    "I",
+                    (
+                        _NULL_LENGTH if value is None else len(value)
+                        for value in encoded
+                    ),
+                )
+                parts.append(_little_endian(lengths))
+                parts.append(b"".join(value for value in encoded if value is not None))
+            elif column.kind == "real":
+                numbers = array(
+                    _TYPECODES["real"],
+                    (float("nan") if value is None else value for value in values),
+                )
+                parts.append(_little_endian(numbers))
+            else:
+                parts.append(_little_endian(array(_TYPECODES["integer"], values)))
+        self.fp.write(b"".join(parts))
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_columnar(fp: BinaryIO) -> Iterator[tuple[tuple[Column, ...], dict[str, list]]]:
+    """Read a file written by ColumnarWriter one block at a time.
+
+    Returns:
+        The columns and a dict of column name to values for each block
+    Raises:
+        ValueError - the file isn't in the columnar format
+    """
+    if fp.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a BankSheets columnar file.")
+    (length,) = struct.unpack("<I", fp.read(4))
+    columns = tuple(Column(*item) for item in json.loads(fp.read(length)))
+
+    while header := fp.read(4):
+        (rows,) = struct.unpack("<I", header)
+        block = {}
+        for column in columns:
+            if column.kind == "text":
+                lengths = _read_array(fp, "I", rows)
+                values = []
+                for size in lengths:
+                    values.append(
+                        None if size == _NULL_LENGTH else fp.read(size).decode()
+                    )
+                block[column.name] = values
+            else:
+                block[column.name] = list(
+                    _read_array(fp, _TYPECODES[column.kind], rows)
+                )
+        yield columns, block
+
+
+def _read_array(fp: BinaryIO, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.frombytes(fp.read(values.itemsize * count))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class SqliteWriter(ReportWriter):
+    """
+    A fresh SQLite database holding the report in a typed table named report.
+    An existing file is deleted first, so overwrite has to be set to replace
+    one. Rows are inserted in one transaction.
+    """
+
+    needs_path = True
+    deletes_existing = True
+
+    def __enter__(self) -> "SqliteWriter":
+        for column in self.columns:
+            if column.kind not in KINDS:
+                raise ValueError(f"{column.kind} is not a column kind.")
+        if not self.overwrite and Path(self.path).exists():
+            raise FileExistsError(f"{self.path} already exists.")
+        Path(self.path).unlink(missing_ok=True)
+        self.fp = sqlite3.connect(self.path)
+        definition = ", ".join(
+            f'"{name}" {kind.upper()}' for name, kind in self.columns
+        )
+        self.fp.execute(f"CREATE TABLE report ({definition});")
+        placeholders = ", ".join("?" * len(self.columns))
+        self._statement = f"INSERT INTO report VALUES ({placeholders});"
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.fp.commit()
+        self.fp.close()
+
+    def write_batch(self, rows: list[tuple]) -> None:
+        self.fp.executemany(self._statement, rows)
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "jsonl": JsonLinesWriter,
+    "columnar": ColumnarWriter,
+    "sqlite": SqliteWriter,
+}
+
+
+def write_report(
+    rows: Iterable[tuple],
+    columns: Sequence[Column],
+    format: str,
+    path: Optional[Path] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    overwrite: bool = False,
+) -> int:
+    """Write report rows in one of the WRITERS formats.
+
+    Args:
+        rows - the report rows, typically a stream from iter_search
+        columns - the name and kind of each value in a row
+        format - the name of the writer
+        path - the file to write, stdout if None
+        batch_size - the number of rows written at a time
+        overwrite - let the sqlite format replace an existing path
+    Returns:
+        The number of rows written
+    Raises:
+        ValueError - the format isn't known or needs a path\n
+        FileExistsError - the sqlite format's path exists and overwrite isn't set
+    """
+    if format not in WRITERS:
+        raise ValueError(f"{format} is not a report format.")
+    with WRITERS[format](path, columns, overwrite) as writer:
+        return writer.write(rows, batch_size)
@@ -4,8 +4,8 @@ import pytest
 
 
 def base_csv_test_file(request, filename: str) -> Path:
-    module_path: Path = Path(request.module.__file__)
-    test_files_dir: Path = module_path.parent / "sample_data"
+    # Relative to this file so tests in sub-packages find the same samples
+    test_files_dir: Path = Path(__file__).parent / "sample_data"
     return test_files_dir / filename
 
 
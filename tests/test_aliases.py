@@ -0,0 +1,53 @@
+import json
+
+from pytest import raises
+
+from banksheets.aliases import AliasRule, AliasRules, InvalidAliasRule
+
+
+def test_rule_kinds():
+    assert AliasRule("AMAZON*", "Amazon").matches("amazon mktp us")
+    assert not AliasRule("AMAZON*", "Amazon").matches("www.amazon.com")
+    assert AliasRule("%coffee_", "Coffee", "like").matches("Joe's Coffee1")
+    assert not AliasRule("%coffee_", "Coffee", "like").matches("Joe's Coffee")
+    assert AliasRule(r"UBER\s+\*TRIP", "Uber", "regex").matches("UBER   *TRIP 123")
+    assert not AliasRule("uber", "Uber", "regex").matches("UBER")
+
+
+def test_invalid():
+    with raises(InvalidAliasRule):
+        AliasRule("x", "X", "exact")
+    with raises(InvalidAliasRule):
+        AliasRule("(unclosed", "X", "regex")
+
+
+def test_first_match_wins():
+    under_test = AliasRules(
+        [AliasRule("AMAZON PRIME*", "Prime"), AliasRule("AMAZON*", "Amazon")]
+    )
+    assert under_test.match("AMAZON PRIME MEMBERSHIP") == "Prime"
+    assert under_test.match("AMAZON MKTP") == "Amazon"
+    assert under_test.match("Company A") is None
+
+
+def test_rules_hash():
+    rules = [AliasRule("A*", "A"), AliasRule("B*", "B")]
+    assert AliasRules(rules).rules_hash == AliasRules(rules).rules_hash
+    assert AliasRules(rules).rules_hash != AliasRules(rules[::-1]).rules_hash
+
+
+def test_load(tmp_path):
+    path = tmp_path / "aliases.json"
+    data = {"aliases": [{"pattern": "^SHELL", "alias": "Fuel", "kind": "regex"}]}
+    path.write_text(json.dumps(data))
+    under_test = AliasRules.from_file(path)
+    assert len(under_test) == 1
+    assert under_test.match("SHELL OIL 1234") == "Fuel"
+
+    with raises(ValueError):
+        AliasRules.from_file(tmp_path / "aliases.yaml")
+
+
+def test_load_missing_alias():
+    with raises(InvalidAliasRule):
+        AliasRules().load_dict({"aliases": [{"pattern": "A*"}]})
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from banksheets.batch import TransactionBatch
+from banksheets.entry import DataEntry
+from banksheets.sql_commands import (
+    create_sql_connection,
+    insert_descriptions,
+    insert_potential_transactions,
+)
+
+
+def test_from_entries(transaction_a, transaction_a_negative, transaction_b):
+    entries = [
+        DataEntry(**transaction_a),
+        None,
+        DataEntry(**transaction_a_negative),
+        DataEntry(**transaction_b),
+    ]
+    under_test = TransactionBatch.from_entries(entries)
+    assert len(under_test) == 3
+    assert under_test.descriptions == ["Company A", "Company B"]
+    assert list(under_test.description_ids) == [0, 0, 1]
+    assert list(under_test.cents) == [10025, -10025, -15075]
+    assert under_test.dates[0] == datetime(2023, 1, 1).toordinal()
+
+
+def test_round_trip(transaction_a, transaction_b):
+    entries = [DataEntry(**transaction_a), DataEntry(**transaction_b)]
+    under_test = TransactionBatch.from_entries(entries)
+    for expected, result in zip(entries, under_test):
+        assert expected.date == result.date
+        assert expected.amount == result.amount
+        assert expected.description == result.description
+        assert expected.extra_desc == result.extra_desc
+
+
+def test_sql_rows(transaction_a, transaction_b):
+    entries = [DataEntry(**transaction_a), DataEntry(**transaction_b)]
+    under_test = TransactionBatch.from_entries(entries)
+    assert list(under_test.sql_rows()) == [
+        ("2023-01-01", 10025, "Company A"),
+        ("2023-02-15", -15075, "Company B"),
+    ]
+
+
+def test_insert(transaction_a, transaction_a_negative):
+    entries = [DataEntry(**transaction_a), DataEntry(**transaction_a_negative)]
+    under_test = TransactionBatch.from_entries(entries)
+    with create_sql_connection(":memory:") as conn:
+        insert_descriptions(under_test, conn)
+        insert_potential_transactions(under_test, conn)
+        c = conn.execute("SELECT date, amount FROM potential_transaction ORDER BY id;")
+        assert c.fetchall() == [("2023-01-01", 10025), ("2023-01-01", -10025)]
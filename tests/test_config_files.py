@@ -0,0 +1,26 @@
+from pytest import raises
+
+from banksheets.config_files import load_file
+
+
+def test_load_json(tmp_path):
+    path = tmp_path / "settings.json"
+    path.write_text('{"aliases": [{"pattern": "A*", "alias": "A"}]}')
+    assert load_file(path, "alias rules") == {
+        "aliases": [{"pattern": "A*", "alias": "A"}]
+    }
+
+
+def test_load_toml(tmp_path):
+    path = tmp_path / "settings.toml"
+    path.write_text('[[aliases]]\npattern = "A*"\nalias = "A"\n')
+    assert load_file(path, "alias rules") == {
+        "aliases": [{"pattern": "A*", "alias": "A"}]
+    }
+
+
+def test_load_unsupported(tmp_path):
+    path = tmp_path / "settings.yaml"
+    path.write_text("aliases: []\n")
+    with raises(ValueError):
+        load_file(path, "alias rules")
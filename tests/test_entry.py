@@ -1,5 +1,6 @@
 from pytest import raises
 
+from banksheets import entry
 from banksheets.entry import DataEntry
 
 
@@ -52,3 +53,40 @@ def test_to_str(transaction_a):
     extra_desc_str = transaction_a["extra_desc"]
     expected = f"{date_str}\t{amount_str}\t{description_str}\t{extra_desc_str}"
     assert str(ut_1) == expected
+
+
+def test_from_rows(transaction_a, transaction_b):
+    bad = dict(transaction_a, amount="one hundred")
+    result = list(DataEntry.from_rows([transaction_a, bad, transaction_b]))
+    assert result == [DataEntry(**transaction_a), None, DataEntry(**transaction_b)]
+
+
+def test_slotted(transaction_a):
+    under_test = DataEntry(**transaction_a)
+    assert not hasattr(under_test, "__dict__")
+    with raises(AttributeError):
+        under_test.amount = 1.0
+
+
+def test_cents(transaction_a_negative):
+    assert DataEntry(**transaction_a_negative).cents == -10025
+
+
+def test_from_tuples():
+    records = [("01/01/2023", "100.25", "Company A", "City1"), ("bad", "1", "B")]
+    result = list(DataEntry.from_tuples(records))
+    assert result == [DataEntry("01/01/2023", "100.25", "Company A", "City1"), None]
+
+
+def test_amount_uses_locale_when_decimal_point_differs(monkeypatch):
+    monkeypatch.setattr(entry, "_plain_amounts_match_locale", lambda: False)
+    monkeypatch.setattr(entry, "atof", lambda text: float(text.replace(".", "")))
+    assert entry._parse_amount("1.234") == 1234.0
+
+
+def test_amount_fast_path_is_plain_numbers_only(monkeypatch):
+    parsed = []
+    monkeypatch.setattr(entry, "atof", lambda text: parsed.append(text) or 0.0)
+    for text in ("1_000", "nan", "inf", "1e3", " 1"):
+        entry._parse_amount(text)
+    assert parsed == ["1_000", "nan", "inf", "1e3", " 1"]
@@ -0,0 +1,76 @@
+import json
+
+from pytest import raises
+
+from banksheets.formats import BankFormat, FormatRegistry, InvalidBankFormat
+
+_CREDIT_UNION = {
+    "name": "credit_union",
+    "headers": ["Amount", "Memo", "When"],
+    "columns": {"date": "When", "amount": "Amount", "description": "Memo"},
+}
+
+
+def test_builtin():
+    under_test = FormatRegistry.builtin()
+    assert len(under_test) == 2
+    assert ["Date", "Description", "Amount", "Running Bal.\n"] in under_test
+    bank_format = under_test.find(["Date", "Description", "Amount", "Running Bal."])
+    assert bank_format.fieldnames == ["date", "description", "amount", None]
+
+
+def test_compile():
+    bank_format = BankFormat(
+        "bofa",
+        ("Posted Date", "Ref", "Payee", "Address", "Amount"),
+        {
+            "date": "Posted Date",
+            "amount": "Amount",
+            "description": "Payee",
+            "extra_desc": "Address",
+        },
+    )
+    mapper = bank_format.compile()
+    row = ["01/01/2023", "123", "Company A", "City1, Street A", "100.25"]
+    assert mapper(row) == ("01/01/2023", "100.25", "Company A", "City1, Street A")
+
+
+def test_invalid():
+    with raises(InvalidBankFormat):
+        BankFormat("bad", ("Date", "Amount"), {"date": "Date", "amount": "Amount"})
+    with raises(InvalidBankFormat):
+        BankFormat(
+            "bad",
+            ("Date", "Amount"),
+            {"date": "Date", "amount": "Amount", "description": "Memo"},
+        )
+
+
+def test_load_json(tmp_path):
+    path = tmp_path / "formats.json"
+    path.write_text(json.dumps({"formats": [_CREDIT_UNION]}))
+    under_test = FormatRegistry.builtin()
+    under_test.load(path)
+    assert len(under_test) == 3
+    assert under_test.find(["Amount", "Memo", "When"]).name == "credit_union"
+
+
+def test_load_toml(tmp_path):
+    path = tmp_path / "formats.toml"
+    path.write_text(
+        "[[formats]]\n"
+        'name = "credit_union"\n'
+        'headers = ["Amount", "Memo", "When"]\n'
+        "[formats.columns]\n"
+        'date = "When"\n'
+        'amount = "Amount"\n'
+        'description = "Memo"\n'
+    )
+    under_test = FormatRegistry()
+    under_test.load(path)
+    assert under_test.find(["Amount", "Memo", "When"]).name == "credit_union"
+
+
+def test_load_unknown_type(tmp_path):
+    with raises(ValueError):
+        FormatRegistry().load(tmp_path / "formats.yaml")
@@ -0,0 +1,116 @@
+import asyncio
+from sqlite3 import OperationalError, ProgrammingError, connect
+
+from pytest import fixture, raises
+
+from banksheets.entry import DataEntry
+from banksheets.pool import ReadPool
+from banksheets.sql_commands import (
+    clear_potential,
+    create_sql_connection,
+    insert_alias,
+    insert_entries,
+    preserve_potential,
+    search,
+)
+
+
+@fixture
+def path(tmp_path):
+    path = tmp_path / "pool.db"
+    entries = [
+        DataEntry("01/01/2023", "100.25", "Company A"),
+        DataEntry("01/02/2023", "-0.25", "Company B"),
+    ]
+    with create_sql_connection(path, journal_mode="wal") as conn:
+        insert_entries(entries, conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+        insert_alias(conn, [1], "Shop")
+    conn.close()
+    return path
+
+
+def test_submit(path):
+    with ReadPool(path, size=2) as pool:
+        futures = [pool.submit(lambda conn: conn.execute("SELECT 1;").fetchone()[0])]
+        futures += [pool.submit(search, None, None, "Shop") for _ in range(8)]
+        assert futures[0].result() == 1
+        for future in futures[1:]:
+            assert future.result() == [("2023-01-01", 100.25, "Shop")]
+
+
+def test_async(path):
+    async def queries(pool: ReadPool):
+        return await asyncio.gather(
+            pool.search(),
+            pool.summary("alias"),
+            pool.descriptions_missing_alias(),
+            pool.duplicate_groups(),
+        )
+
+    with ReadPool(path) as pool:
+        transactions, summary, missing, groups = asyncio.run(queries(pool))
+    assert transactions == [
+        ("2023-01-01", 100.25, "Shop"),
+        ("2023-01-02", -0.25, "Company B"),
+    ]
+    assert summary == [("Company B", -0.25, 1), ("Shop", 100.25, 1)]
+    assert missing == [("Company B",)]
+    assert groups == []
+
+
+def test_reads_during_write(path):
+    writer = create_sql_connection(path)
+    with ReadPool(path, size=1) as pool:
+        writer.execute("BEGIN IMMEDIATE;")
+        writer.execute("DELETE FROM bank_transaction;")
+        rows = pool.run(
+            lambda conn: conn.execute("SELECT * FROM bank_transaction;").fetchall()
+        )
+        assert len(rows) == 2
+        writer.rollback()
+        with raises(OperationalError):
+            pool.run(lambda conn: conn.execute("DELETE FROM bank_transaction;"))
+    writer.close()
+
+
+def test_missing_file(tmp_path):
+    with raises(FileNotFoundError):
+        ReadPool(tmp_path / "missing.db")
+
+
+def test_opens_without_writing(tmp_path, path):
+    rollback = tmp_path / "rollback.db"
+    create_sql_connection(rollback).close()
+    for database in (path, rollback):
+        writer = create_sql_connection(database)
+        writer.execute("BEGIN IMMEDIATE;")
+        writer.execute("DELETE FROM description_alias;")
+        with ReadPool(database, size=1) as pool:
+            mode = pool.run(
+                lambda conn: conn.execute("PRAGMA journal_mode;").fetchone()[0]
+            )
+        assert mode == ("wal" if database == path else "delete")
+        writer.rollback()
+        writer.close()
+
+
+def test_outdated_schema(tmp_path):
+    old = tmp_path / "old.db"
+    conn = connect(old)
+    conn.execute("CREATE TABLE description (id INTEGER PRIMARY KEY);")
+    conn.close()
+    with raises(ValueError):
+        ReadPool(old)
+
+
+def test_close_with_borrowed_connection(path):
+    pool = ReadPool(path, size=1)
+    with pool.connection() as conn:
+        pool.close()
+        assert conn.execute("SELECT 1;").fetchone() == (1,)
+    with raises(ProgrammingError):
+        conn.execute("SELECT 1;")
+    with raises(RuntimeError):
+        pool.run(search, None, None, None)
@@ -0,0 +1,89 @@
+import json
+from io import StringIO
+
+from pytest import fixture
+
+from banksheets.entry import DataEntry
+from banksheets.profiling import (
+    Profiler,
+    StageStats,
+    disable_profiling,
+    enable_profiling,
+    get_profiler,
+)
+from banksheets.sql_commands import (
+    create_sql_connection,
+    insert_entries,
+    preserve_potential,
+    resolve_duplicates,
+)
+
+
+@fixture
+def profiler():
+    yield enable_profiling()
+    disable_profiling()
+
+
+def test_disabled():
+    under_test = Profiler(enabled=False)
+    with under_test.stage("stage", 10):
+        pass
+    assert list(under_test.iterate("parse", [1, None])) == [1, None]
+    under_test.record_statement("SELECT 1;", 1.0)
+    assert under_test.stages == {}
+    assert under_test.statements == {}
+    assert not get_profiler().enabled
+
+
+def test_iterate():
+    under_test = Profiler()
+    assert list(under_test.iterate("parse", [1, None, 2])) == [1, None, 2]
+    stats = under_test.stages["parse"]
+    assert (stats.calls, stats.rows, stats.rejected) == (1, 2, 1)
+
+
+def test_merge():
+    under_test = Profiler()
+    with under_test.stage("headers"):
+        pass
+    under_test.merge({"headers": StageStats(calls=2, rows=1, rejected=1)})
+    stats = under_test.stages["headers"]
+    assert (stats.calls, stats.rows, stats.rejected) == (3, 1, 1)
+
+
+def test_statements_by_stage():
+    under_test = Profiler()
+    under_test.record_statement("SELECT 1;", 1.0)
+    with under_test.stage("outer"):
+        with under_test.stage("inner"):
+            under_test.record_statement("SELECT  1;", 2.0)
+        under_test.record_statement("SELECT 1;", 3.0)
+    assert {key: stats.seconds for key, stats in under_test.statements.items()} == {
+        (None, "SELECT 1;"): 1.0,
+        ("inner", "SELECT 1;"): 2.0,
+        ("outer", "SELECT 1;"): 3.0,
+    }
+
+
+def test_insert_stages(profiler: Profiler):
+    entry = DataEntry("01/01/2023", "100.25", "Company A")
+    with create_sql_connection(":memory:") as conn:
+        insert_entries([entry, entry, None], conn)
+        resolve_duplicates(conn, "keep-one")
+        preserve_potential(conn)
+
+    assert profiler.stages["descriptions"].rows == 1
+    assert profiler.stages["stage"].rows == 2
+    assert profiler.stages["duplicates"].rejected == 1
+    assert profiler.stages["preserve"].rows == 1
+    statement = "INSERT OR IGNORE INTO description(name, extra_desc, display_name)"
+    assert any(
+        stage == "descriptions" and sql.startswith(statement)
+        for stage, sql in profiler.statements
+    )
+
+    fp = StringIO()
+    profiler.dump(fp)
+    summary = json.loads(fp.getvalue())
+    assert summary["stages"]["stage"]["calls"] == 1
@@ -1,15 +1,34 @@
-from sqlite3 import Connection
+from importlib.resources import files
+from sqlite3 import Connection, OperationalError, connect
 
-from pytest import fixture, raises
+from pytest import fixture, mark, raises
 
+from banksheets.aliases import AliasRule, AliasRules
 from banksheets.entry import DataEntry
 from banksheets.sql_commands import (
+    BankSheetsConnection,
+    DescriptionCache,
+    IngestSession,
+    InvalidMatchQuery,
+    apply_alias_rules,
+    clear_potential,
     create_sql_connection,
+    get_duplicate_groups,
     get_duplicate_records,
+    get_potential_duplicates,
+    insert_alias,
     insert_descriptions,
+    insert_entries,
     insert_potential_transactions,
+    iter_duplicate_groups,
+    iter_search,
+    iter_summary,
     preserve_potential,
     remove_potential,
+    replace_alias,
+    resolve_duplicates,
+    search,
+    skip_duplicates,
 )
 
 
@@ -122,7 +141,7 @@ def test_insert_potential_transactions_no_duplicates(
         res = c.fetchall()
         assert len(res) == 1
         assert generic_entry.date.strftime("%d/%m/%Y") == res[0][1]
-        assert generic_entry.amount == float(res[0][2])
+        assert generic_entry.cents == res[0][2]
 
         res = get_duplicate_records(conn)
         assert len(res) == 0
@@ -145,11 +164,12 @@ def test_get_duplicates_one_duplicate(sql: Connection, generic_entry: DataEntry)
         insert_descriptions([generic_entry], conn)
         insert_potential_transactions([generic_entry], conn)
         preserve_potential(conn)
+        clear_potential(conn)
 
         insert_potential_transactions([generic_entry], conn)
         records = get_duplicate_records(conn)
         assert len(records) == 1
-        assert generic_entry.date.strftime("%d/%m/%Y") == records[0][0]
+        assert generic_entry.date.strftime("%Y-%m-%d") == records[0][0]
         assert generic_entry.amount == float(records[0][1])
         assert generic_entry.description == records[0][2]
 
@@ -159,11 +179,12 @@ def test_get_duplicates_multiple_same(sql: Connection, generic_entry: DataEntry)
         insert_descriptions([generic_entry], conn)
         insert_potential_transactions([generic_entry], conn)
         preserve_potential(conn)
+        clear_potential(conn)
 
         insert_potential_transactions([generic_entry, generic_entry], conn)
         records = get_duplicate_records(conn)
         assert len(records) == 2
-        assert generic_entry.date.strftime("%d/%m/%Y") == records[0][0]
+        assert generic_entry.date.strftime("%Y-%m-%d") == records[0][0]
         assert generic_entry.amount == float(records[0][1])
         assert generic_entry.description == records[0][2]
 
@@ -175,6 +196,7 @@ def test_get_duplicates_multiple_different(
         insert_descriptions([generic_entry], conn)
         insert_potential_transactions([generic_entry], conn)
         preserve_potential(conn)
+        clear_potential(conn)
 
         insert_potential_transactions([generic_entry1, generic_entry1], conn)
         records = get_duplicate_records(conn)
@@ -189,6 +211,19 @@ def test_get_duplicates_no_duplicates(sql: Connection, generic_entry: DataEntry)
         assert len(records) == 0
 
 
+def test_get_duplicates_memory_staging(sql: Connection, generic_entry: DataEntry):
+    with IngestSession(sql, staging="memory") as conn:
+        insert_entries([generic_entry], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+
+        insert_entries([generic_entry], conn)
+        records = get_duplicate_records(conn)
+        assert [record[:3] for record in records] == [
+            ("2023-01-01", 100.25, "Company A")
+        ]
+
+
 def test_preserve_potential(sql: Connection, generic_entry: DataEntry):
     with sql as conn:
         insert_descriptions([generic_entry], conn)
@@ -246,3 +281,487 @@ def test_remove_from_potential_multiple(
         res = conn.execute(statement)
         records = res.fetchall()
         assert len(records) == 1
+
+
+def test_remove_from_potential_ids(sql: Connection, generic_entry: DataEntry):
+    with sql as conn:
+        insert_potential_transactions([generic_entry] * 3, conn)
+        remove_potential(conn, iter([1, 3, 3]))
+
+        c = conn.execute("SELECT id FROM potential_transaction;")
+        assert c.fetchall() == [(2,)]
+
+
+def test_remove_from_potential_many(sql: Connection):
+    # More ids than SQLite allows bound parameters in one statement.
+    count = 40_000
+    statements = []
+    with sql as conn:
+        conn.execute(
+            "WITH RECURSIVE n(id) AS (SELECT 1 UNION ALL SELECT id + 1 FROM n"
+            " WHERE id <= ?) INSERT INTO potential_transaction(id, date, amount)"
+            " SELECT id, '2023-01-01', id FROM n;",
+            (count,),
+        )
+        conn.set_trace_callback(statements.append)
+        remove_potential(conn, range(1, count + 1))
+        conn.set_trace_callback(None)
+
+        c = conn.execute("SELECT id FROM potential_transaction;")
+        assert c.fetchall() == [(count + 1,)]
+
+    deletes = [s for s in statements if s.startswith("DELETE FROM potential")]
+    assert deletes == [
+        "DELETE FROM potential_transaction WHERE id IN"
+        " (SELECT id FROM temp.removed_id);"
+    ]
+
+
+def test_insert_entries_batches(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        entries = (e for e in [generic_entry, None, generic_entry1, generic_entry])
+        staged = insert_entries(entries, conn, batch_size=2)
+        assert staged == 3
+
+        c = conn.execute("SELECT * FROM potential_transaction;")
+        assert len(c.fetchall()) == 3
+
+        c = conn.execute("SELECT name FROM description;")
+        assert len(c.fetchall()) == 1
+
+
+def test_insert_entries_none(sql: Connection):
+    with raises(TypeError):
+        insert_entries(None, sql)
+
+
+def test_upgrade_existing_database(tmp_path):
+    path = tmp_path / "old.db"
+    old = connect(path)
+    old.executescript((files("banksheets.data") / "schema.sql").read_text())
+    old.execute("INSERT INTO description(name) VALUES ('Company A');")
+    for _ in range(2):
+        old.execute(
+            "INSERT INTO bank_transaction(date, amount, description_id)"
+            " VALUES ('2023-01-01', '-100.25', 1);"
+        )
+    old.execute("INSERT INTO description_alias(description_id, name) VALUES (1, 'A');")
+    old.commit()
+    old.close()
+
+    with create_sql_connection(path) as conn:
+        assert conn.execute("PRAGMA user_version;").fetchone()[0] >= 1
+        c = conn.execute("SELECT amount, typeof(amount) FROM bank_transaction;")
+        assert c.fetchone() == (-10025, "integer")
+        c = conn.execute("SELECT name FROM sqlite_master WHERE type='index';")
+        indexes = [row[0] for row in c.fetchall()]
+        assert "bank_transaction_key" in indexes
+        assert "potential_transaction_key" in indexes
+        assert search(conn, None, None, None) == [("2023-01-01", -100.25, "A")] * 2
+        c = conn.execute("SELECT ordinal FROM bank_transaction ORDER BY id;")
+        assert c.fetchall() == [(1,), (2,)]
+
+
+def test_get_duplicate_groups_none(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        insert_entries([generic_entry, generic_entry1], conn)
+        assert get_duplicate_groups(conn) == []
+
+
+def test_get_duplicate_groups_staged_and_saved(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        insert_entries([generic_entry], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+
+        insert_entries([generic_entry1, generic_entry, generic_entry1], conn)
+        groups = get_duplicate_groups(conn)
+        assert len(groups) == 2
+
+        saved, staged = groups
+        assert saved.ids == [2]
+        assert saved.staged_count == 1
+        assert saved.saved_count == 1
+        assert saved.details == ("2023-01-01", 100.25, "Company A", 1)
+
+        assert staged.ids == [1, 3]
+        assert staged.staged_count == 2
+        assert staged.saved_count == 0
+        assert staged.details == ("2024-01-01", 100.25, "Company A", 1)
+
+
+def test_description_cache(sql: Connection, generic_entry: DataEntry):
+    with sql as conn:
+        insert_descriptions([generic_entry], conn)
+        under_test = DescriptionCache(conn)
+        assert under_test.ids(["Company B", "Company A", "Company B"]) == [2, 1, 2]
+        assert under_test.ids(["Company C"]) == [3]
+
+        c = conn.execute("SELECT id, name FROM description ORDER BY id;")
+        assert c.fetchall() == [(1, "Company A"), (2, "Company B"), (3, "Company C")]
+
+
+def test_insert_potential_transactions_without_descriptions(
+    sql: Connection, generic_entry: DataEntry
+):
+    with sql as conn:
+        insert_potential_transactions([generic_entry], conn)
+        c = conn.execute(
+            "SELECT d.name FROM potential_transaction pt"
+            " JOIN description d ON d.id = pt.description_id;"
+        )
+        assert c.fetchall() == [(generic_entry.description,)]
+
+
+def test_ingest_session_defers_commits(tmp_path, generic_entry: DataEntry):
+    path = tmp_path / "session.db"
+    conn = create_sql_connection(path)
+    with IngestSession(conn, journal_mode="wal", synchronous="normal") as db:
+        insert_entries([generic_entry], db)
+        preserve_potential(db)
+        other = connect(path)
+        c = other.execute("SELECT COUNT(*) FROM bank_transaction;")
+        assert c.fetchone()[0] == 0
+
+    c = other.execute("SELECT COUNT(*) FROM bank_transaction;")
+    assert c.fetchone()[0] == 1
+    assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    other.close()
+    conn.close()
+
+
+def test_ingest_session_checkpoint(tmp_path, generic_entry: DataEntry):
+    path = tmp_path / "checkpoint.db"
+    conn = create_sql_connection(path)
+    other = connect(path, timeout=0)
+    session = IngestSession(conn, staging="memory")
+    with session as db:
+        insert_entries([generic_entry], db)
+        session.checkpoint()
+        other.execute("INSERT INTO description(name) VALUES ('Company B');")
+        other.commit()
+        preserve_potential(db)
+
+    c = other.execute("SELECT COUNT(*) FROM bank_transaction;")
+    assert c.fetchone()[0] == 1
+    other.close()
+    conn.close()
+
+
+def test_ingest_session_rollback(sql: Connection, generic_entry: DataEntry):
+    with raises(RuntimeError):
+        with IngestSession(sql):
+            insert_entries([generic_entry], sql)
+            raise RuntimeError()
+
+    c = sql.execute("SELECT COUNT(*) FROM potential_transaction;")
+    assert c.fetchone()[0] == 0
+
+
+def test_ingest_session_bad_pragma(sql: Connection):
+    with raises(ValueError):
+        IngestSession(sql, journal_mode="fast")
+
+
+def test_ingest_session_memory_staging(tmp_path, generic_entry: DataEntry):
+    path = tmp_path / "staging.db"
+    conn = create_sql_connection(path)
+    with IngestSession(conn, staging="memory") as db:
+        insert_entries([generic_entry, generic_entry], db)
+        other = connect(path)
+        c = other.execute("SELECT COUNT(*) FROM potential_transaction;")
+        assert c.fetchone()[0] == 0
+        skip_duplicates(db)
+        preserve_potential(db)
+
+    c = other.execute("SELECT COUNT(*) FROM bank_transaction;")
+    assert c.fetchone()[0] == 1
+    c = conn.execute("SELECT name FROM sqlite_temp_master WHERE type='table';")
+    assert c.fetchall() == []
+    other.close()
+    conn.close()
+
+
+def test_ingest_session_commit_fails(tmp_path, monkeypatch, generic_entry: DataEntry):
+    conn = create_sql_connection(tmp_path / "failing.db")
+
+    def fail(self):
+        if self.session_depth == 0:
+            raise OperationalError("database is locked")
+
+    with monkeypatch.context() as m:
+        m.setattr(BankSheetsConnection, "commit", fail)
+        with raises(OperationalError):
+            with IngestSession(conn, staging="memory") as db:
+                insert_entries([generic_entry], db)
+                preserve_potential(db)
+
+    assert not conn.in_transaction
+    c = conn.execute("SELECT name FROM sqlite_temp_master WHERE type='table';")
+    assert c.fetchall() == []
+    c = conn.execute("SELECT COUNT(*) FROM bank_transaction;")
+    assert c.fetchone()[0] == 0
+    conn.close()
+
+
+def test_ingest_session_leftover_staging(sql: Connection, generic_entry: DataEntry):
+    sql.execute("PRAGMA temp_store = MEMORY;")
+    sql.execute("CREATE TEMP TABLE potential_transaction (id INTEGER);")
+    with IngestSession(sql, staging="memory") as db:
+        insert_entries([generic_entry], db)
+        preserve_potential(db)
+
+    c = sql.execute("SELECT COUNT(*) FROM bank_transaction;")
+    assert c.fetchone()[0] == 1
+
+
+def test_ingest_session_bad_staging(sql: Connection):
+    with raises(ValueError):
+        IngestSession(sql, staging="tape")
+
+
+def test_iter_search(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        insert_entries([generic_entry1, generic_entry, generic_entry], conn)
+        preserve_potential(conn)
+
+        result = iter_search(conn, None, None, None, batch_size=1)
+        assert not isinstance(result, list)
+        assert list(result) == [
+            ("2023-01-01", 100.25, "Company A"),
+            ("2023-01-01", 100.25, "Company A"),
+            ("2024-01-01", 100.25, "Company A"),
+        ]
+        assert list(iter_search(conn, "2023-06-01", None, None)) == [
+            ("2024-01-01", 100.25, "Company A")
+        ]
+
+
+def test_iter_duplicate_groups(sql: Connection, generic_entry: DataEntry):
+    with sql as conn:
+        insert_entries([generic_entry] * 3, conn)
+        result = iter_duplicate_groups(conn, batch_size=1)
+        assert [group.ids for group in result] == [[1, 2, 3]]
+
+
+def test_iter_summary(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    other = DataEntry("01/20/2023", "-0.25", "Company B")
+    with sql as conn:
+        insert_entries([generic_entry, other], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+        insert_entries([generic_entry, generic_entry1], conn)
+        preserve_potential(conn)
+
+        assert list(iter_summary(conn, "month", None, None, None)) == [
+            ("2023-01", 200.25, 3),
+            ("2024-01", 100.25, 1),
+        ]
+        assert list(iter_summary(conn, "description", None, "2023-12-31", None)) == [
+            ("Company A", 200.5, 2),
+            ("Company B", -0.25, 1),
+        ]
+        assert list(iter_summary(conn, "alias", None, None, "Company B")) == [
+            ("Company B", -0.25, 1)
+        ]
+
+
+def test_iter_summary_bad_group(sql: Connection):
+    with raises(ValueError):
+        iter_summary(sql, "year", None, None, None)
+
+
+def test_fingerprints_number_copies(sql: Connection, generic_entry: DataEntry):
+    with sql as conn:
+        insert_entries([generic_entry] * 2, conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+        insert_entries([generic_entry], conn)
+        insert_entries([generic_entry], conn)
+
+        c = conn.execute("SELECT ordinal FROM potential_transaction ORDER BY id;")
+        assert c.fetchall() == [(1,), (2,)]
+        preserve_potential(conn)
+        c = conn.execute(
+            "SELECT ordinal, fingerprint FROM bank_transaction ORDER BY id;"
+        )
+        rows = c.fetchall()
+        assert [row[0] for row in rows] == [1, 2, 3, 4]
+        assert len({row[1] for row in rows}) == 4
+
+
+def test_get_potential_duplicates(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        insert_entries([generic_entry] * 2, conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+        insert_entries([generic_entry, generic_entry1, generic_entry1], conn)
+
+        rows = get_potential_duplicates(conn)
+        assert [(row[1], row[-1]) for row in rows] == [
+            ("2023-01-01", 2),
+            ("2024-01-01", 0),
+            ("2024-01-01", 0),
+        ]
+
+
+def test_skip_duplicates(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    with sql as conn:
+        insert_entries([generic_entry], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+
+        insert_entries([generic_entry, generic_entry1, generic_entry1], conn)
+        skip_duplicates(conn)
+        c = conn.execute("SELECT id, date FROM potential_transaction;")
+        assert c.fetchall() == [(2, "2024-01-01")]
+
+
+@mark.parametrize(
+    "policy, expected",
+    [
+        ("keep-all", 6),
+        ("keep-one", 2),
+        ("keep-max-of-file-count", 4),
+        ("trust-db", 3),
+    ],
+)
+def test_resolve_duplicates(
+    sql: Connection,
+    generic_entry: DataEntry,
+    generic_entry1: DataEntry,
+    policy: str,
+    expected: int,
+):
+    other = DataEntry("01/20/2023", "-0.25", "Company B")
+    with sql as conn:
+        insert_entries([generic_entry, generic_entry], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+
+        insert_entries([generic_entry] * 3 + [generic_entry1] * 2 + [other], conn)
+        resolve_duplicates(conn, policy)
+        preserve_potential(conn)
+        c = conn.execute("SELECT COUNT(*) FROM bank_transaction;")
+        assert c.fetchone()[0] == 2 + expected
+
+
+def test_resolve_duplicates_bad_policy(sql: Connection):
+    with raises(ValueError):
+        resolve_duplicates(sql, "keep-some")
+
+
+def test_alias_display_name(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    other = DataEntry("01/20/2023", "-0.25", "Company B")
+    with sql as conn:
+        insert_entries([generic_entry, other], conn)
+        preserve_potential(conn)
+        insert_alias(conn, [1], "Shop")
+        insert_alias(conn, [1], "Ignored")
+
+        c = conn.execute("SELECT name, display_name FROM description ORDER BY id;")
+        assert c.fetchall() == [("Company A", "Shop"), ("Company B", "Company B")]
+        assert search(conn, None, None, "Shop") == [("2023-01-01", 100.25, "Shop")]
+        assert search(conn, None, None, "Company A") == [("2023-01-01", 100.25, "Shop")]
+
+        replace_alias(conn, [1, 2], "Store")
+        assert list(iter_summary(conn, "alias", None, None, "Store")) == [
+            ("Store", 100.0, 2)
+        ]
+        conn.execute("DELETE FROM description_alias WHERE description_id = 2;")
+        c = conn.execute("SELECT display_name FROM description WHERE id = 2;")
+        assert c.fetchone() == ("Company B",)
+
+
+def test_apply_alias_rules(sql: Connection):
+    entries = [
+        DataEntry("01/01/2023", "-5", "AMAZON MKTP"),
+        DataEntry("01/02/2023", "-7", "Company A"),
+        DataEntry("01/03/2023", "-9", "Company B"),
+    ]
+    rules = AliasRules([AliasRule("amazon*", "Amazon"), AliasRule("Company*", "Co")])
+    with sql as conn:
+        insert_entries(entries[:2], conn)
+        replace_alias(conn, [2], "Manual")
+        assert apply_alias_rules(conn, rules) == 1
+
+        insert_entries(entries[2:], conn)
+        assert apply_alias_rules(conn, rules) == 1
+
+        changed = AliasRules([AliasRule("Company B", "Bee")])
+        assert apply_alias_rules(conn, changed) == 1
+        c = conn.execute("SELECT display_name FROM description ORDER BY id;")
+        assert c.fetchall() == [("AMAZON MKTP",), ("Manual",), ("Bee",)]
+
+
+def test_search_match(
+    sql: Connection, generic_entry: DataEntry, generic_entry1: DataEntry
+):
+    other = DataEntry("01/20/2023", "-0.25", "Coffee Shop", "Main Street")
+    with sql as conn:
+        insert_entries([generic_entry, other], conn)
+        preserve_potential(conn)
+        clear_potential(conn)
+        insert_entries([generic_entry1], conn)
+        preserve_potential(conn)
+
+        c = conn.execute("SELECT name, extra_desc FROM description ORDER BY id;")
+        assert c.fetchall() == [
+            ("Company A", "City1, Street A"),
+            ("Coffee Shop", "Main Street"),
+        ]
+        assert search(conn, None, None, None, match="coff*") == [
+            ("2023-01-20", -0.25, "Coffee Shop")
+        ]
+        assert search(conn, None, "2023-12-31", None, match="street") == [
+            ("2023-01-01", 100.25, "Company A"),
+            ("2023-01-20", -0.25, "Coffee Shop"),
+        ]
+
+        replace_alias(conn, [2], "Latte Place")
+        assert list(iter_summary(conn, "alias", None, None, None, match="latte")) == [
+            ("Latte Place", -0.25, 1)
+        ]
+        conn.execute(
+            "INSERT INTO description_fts(description_fts, rank)"
+            " VALUES ('integrity-check', 1);"
+        )
+
+
+def test_search_invalid_match(sql: Connection):
+    with sql as conn:
+        with raises(InvalidMatchQuery):
+            iter_search(conn, None, None, None, match="AND(")
+        with raises(InvalidMatchQuery):
+            iter_summary(conn, "month", None, None, None, match="AND(")
+
+
+def test_description_cache_concurrent_writer(tmp_path, generic_entry: DataEntry):
+    path = tmp_path / "shared.db"
+    conn = create_sql_connection(path)
+    other = create_sql_connection(path)
+    insert_descriptions([generic_entry], conn)
+    under_test = DescriptionCache(conn)
+
+    other.execute("INSERT INTO description(name) VALUES ('Company B');")
+    other.execute("INSERT INTO description(name) VALUES ('Company C');")
+    other.commit()
+    assert under_test.ids(["Company C", "Company D", "Company A"]) == [3, 4, 1]
+    conn.close()
+    other.close()
@@ -1,6 +1,14 @@
+from io import StringIO
+
 from pytest import raises
 
-from banksheets.transaction_reader import NoHeaderException, SkipAheadDictReader
+from banksheets.formats import BankFormat, FormatRegistry
+from banksheets.transaction_reader import (
+    MissingHeadingMapping,
+    NoHeaderException,
+    SkipAheadDictReader,
+    SkipAheadReader,
+)
 
 
 def test_bofa_bank(bofa_bank_test_file):
@@ -25,3 +33,47 @@ def test_wells_bank(wells_bank_test_file):
     with raises(NoHeaderException):
         with open(wells_bank_test_file) as csvfile:
             SkipAheadDictReader(csvfile)
+
+
+def test_long_preamble():
+    preamble = ['"Balance as of 01/01/2023",,"1.00"', '"Total credits 5",,"2.00"'] * 50
+    text = "\n".join(
+        ["Description,,Summary Amt.", *preamble, "", "Date,Description,Amount"]
+    )
+    text += ',Running Bal.\n1/1/2023,"Transaction A",50.25,"99999950.74"\n'
+    rows = list(SkipAheadDictReader(StringIO(text)))
+    assert rows == [
+        {"date": "1/1/2023", "description": "Transaction A", "amount": "50.25"}
+    ]
+
+
+def test_contains_date():
+    assert SkipAheadDictReader._contains_date(["01/31/2023", "x"])
+    assert SkipAheadDictReader._contains_date(['"2023-01-31"'])
+    assert SkipAheadDictReader._contains_date(["Jan 31 2023"])
+    assert not SkipAheadDictReader._contains_date(["Posted Date"])
+    assert not SkipAheadDictReader._contains_date(["Balance as of 01/31/2023"])
+    assert not SkipAheadDictReader._contains_date(["\n"])
+
+
+def test_skip_ahead_reader(bofa_cc_test_file):
+    with open(bofa_cc_test_file, newline="") as csvfile:
+        rows = list(SkipAheadReader(csvfile))
+        assert len(rows) == 5
+        assert rows[0] == ("01/01/2023", "100.25", "Company A", "City1, Street A")
+
+
+def test_skip_ahead_reader_custom_format():
+    registry = FormatRegistry()
+    registry.register(
+        BankFormat(
+            "credit_union",
+            ("Amount", "Memo", "When"),
+            {"date": "When", "amount": "Amount", "description": "Memo"},
+        )
+    )
+    text = 'Amount,Memo,When\n-4.50,"Coffee, Inc",2/1/2023\n\n1.00,Short\n'
+    with raises(MissingHeadingMapping):
+        SkipAheadReader(StringIO(text))
+    rows = list(SkipAheadReader(StringIO(text), registry))
+    assert rows == [("2/1/2023", "-4.50", "Coffee, Inc")]
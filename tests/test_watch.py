@@ -0,0 +1,135 @@
+import os
+import shutil
+import threading
+from sqlite3 import OperationalError
+
+from pytest import fixture, raises
+
+from banksheets import watch
+from banksheets.sql_commands import BankSheetsConnection, create_sql_connection
+from banksheets.watch import Watcher
+
+
+@fixture
+def folder(tmp_path, bofa_bank_test_file):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    shutil.copy(bofa_bank_test_file, folder / "bank.csv")
+    return folder
+
+
+def _saved(db) -> int:
+    return db.execute("SELECT COUNT(*) FROM bank_transaction;").fetchone()[0]
+
+
+def test_poll(folder):
+    ingested = []
+    with create_sql_connection(":memory:") as db:
+        under_test = Watcher(
+            folder, db, settle=0, on_ingest=lambda *args: ingested.append(args)
+        )
+        assert under_test.poll() == 5
+        assert _saved(db) == 5
+        assert ingested == [([(folder / "bank.csv").resolve()], 5)]
+
+        assert under_test.poll() == 0
+
+        with open(folder / "bank.csv", "a") as fp:
+            fp.write('6/1/2023,"Transaction F",1.00,"99999986.74"\n')
+            fp.write('1/1/2023,"Transaction A",50.25,"99999950.74"\n')
+        assert under_test.poll() == 2
+        assert _saved(db) == 6
+
+
+def test_poll_waits_for_settle(folder, monkeypatch):
+    planned = []
+
+    def plan_files(files, db):
+        planned.extend(files)
+        return original(files, db)
+
+    original = watch.plan_files
+    monkeypatch.setattr(watch, "plan_files", plan_files)
+    with create_sql_connection(":memory:") as db:
+        under_test = Watcher(folder, db, settle=3600)
+        assert under_test.poll() == 0
+        assert planned == []
+
+        old = os.stat(folder / "bank.csv").st_mtime - 7200
+        os.utime(folder / "bank.csv", (old, old))
+        assert under_test.poll() == 5
+
+
+def test_run_and_stop(folder):
+    path = folder.parent / "watch.db"
+
+    def watch() -> None:
+        # sqlite connections stay on the thread that made them
+        with create_sql_connection(path) as db:
+            under_test = Watcher(folder, db, interval=0.1, settle=0)
+            under_test.on_ingest = lambda *args: under_test.stop()
+            under_test.run()
+        db.close()
+
+    thread = threading.Thread(target=watch)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    db = create_sql_connection(path)
+    assert _saved(db) == 5
+    db.close()
+
+
+def test_not_a_folder(bofa_bank_test_file):
+    with raises(NotADirectoryError):
+        Watcher(bofa_bank_test_file, None)
+
+
+def test_poll_survives_errors(folder, monkeypatch, caplog):
+    (folder / "gone.csv").symlink_to(folder / "missing.csv")
+    calls = []
+
+    def ingest(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("database is locked")
+        return original(*args)
+
+    original = watch.ingest
+    monkeypatch.setattr(watch, "ingest", ingest)
+    with create_sql_connection(":memory:") as db:
+        under_test = Watcher(folder, db, settle=0)
+        assert under_test.poll() == 0
+        assert "gone.csv" in caplog.text
+        assert "database is locked" in caplog.text
+        assert _saved(db) == 0
+
+        assert under_test.poll() == 5
+        assert _saved(db) == 5
+
+
+def test_poll_after_failed_commit(folder, bofa_cc_test_file, monkeypatch, caplog):
+    failures = []
+
+    def commit(self):
+        if self.session_depth == 0 and not failures:
+            failures.append(self)
+            raise OperationalError("disk I/O error")
+        original(self)
+
+    original = BankSheetsConnection.commit
+    with create_sql_connection(folder.parent / "watch.db") as db:
+        monkeypatch.setattr(BankSheetsConnection, "commit", commit)
+        under_test = Watcher(folder, db, settle=0)
+        assert under_test.poll() == 0
+        assert "disk I/O error" in caplog.text
+        assert not db.in_transaction
+        assert _saved(db) == 0
+
+        assert under_test.poll() == 5
+        assert _saved(db) == 5
+
+        shutil.copy(bofa_cc_test_file, folder / "card.csv")
+        assert under_test.poll() == 5
+        assert _saved(db) == 10
+    db.close()
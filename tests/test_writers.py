@@ -0,0 +1,92 @@
+import json
+import sqlite3
+
+from pytest import raises
+
+from banksheets.writers import (
+    SEARCH_COLUMNS,
+    ColumnarWriter,
+    ReportWriter,
+    read_columnar,
+    summary_columns,
+    write_report,
+)
+
+ROWS = [
+    ("2023-01-01", 100.25, "Company A"),
+    ("2023-01-02", -0.5, 'Store "B", Main St'),
+    ("2023-01-03", 7.0, None),
+]
+
+
+def test_csv(tmp_path):
+    path = tmp_path / "report.csv"
+    assert write_report(ROWS, SEARCH_COLUMNS, "csv", path, batch_size=2) == 3
+    assert path.read_text().splitlines() == [
+        "2023-01-01,100.25,Company A",
+        '2023-01-02,-0.5,"Store ""B"", Main St"',
+        "2023-01-03,7.0,",
+    ]
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / "report.jsonl"
+    write_report(ROWS[:1], SEARCH_COLUMNS, "jsonl", path)
+    assert json.loads(path.read_text()) == {
+        "date": "2023-01-01",
+        "amount": 100.25,
+        "description": "Company A",
+    }
+
+
+def test_columnar(tmp_path):
+    path = tmp_path / "report.bin"
+    assert write_report(ROWS, SEARCH_COLUMNS, "columnar", path, batch_size=2) == 3
+    with open(path, "rb") as fp:
+        blocks = list(read_columnar(fp))
+    assert [columns for columns, _ in blocks] == [SEARCH_COLUMNS] * 2
+    assert blocks[0][1]["description"] == ["Company A", 'Store "B", Main St']
+    assert blocks[1][1] == {
+        "date": ["2023-01-03"],
+        "amount": [7.0],
+        "description": [None],
+    }
+
+
+def test_columnar_needs_path():
+    with raises(ValueError):
+        ColumnarWriter(None, SEARCH_COLUMNS)
+
+
+def test_sqlite(tmp_path):
+    path = tmp_path / "report.db"
+    rows = [("2023-01", 200.5, 2), ("2023-02", -0.25, 1)]
+    write_report(rows, summary_columns("month"), "sqlite", path)
+    conn = sqlite3.connect(path)
+    c = conn.execute("SELECT month, total, count FROM report ORDER BY month;")
+    assert c.fetchall() == rows
+    conn.close()
+
+
+def test_unknown_format(tmp_path):
+    with raises(ValueError):
+        write_report(ROWS, SEARCH_COLUMNS, "xml", tmp_path / "report.xml")
+
+
+def test_existing_file(tmp_path):
+    path = tmp_path / "report.db"
+    path.write_text("keep me")
+    with raises(FileExistsError):
+        write_report(ROWS, SEARCH_COLUMNS, "sqlite", path)
+    assert path.read_text() == "keep me"
+    assert write_report(ROWS, SEARCH_COLUMNS, "sqlite", path, overwrite=True) == 3
+
+    for format in ("csv", "jsonl"):
+        path.write_text("replace me")
+        assert write_report(ROWS, SEARCH_COLUMNS, format, path) == 3
+        assert "replace me" not in path.read_text()
+
+
+def test_writer_is_abstract():
+    with raises(TypeError):
+        ReportWriter(None, SEARCH_COLUMNS)
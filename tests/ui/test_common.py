@@ -1,5 +1,19 @@
+import os
+import shutil
+from pathlib import Path
+from types import GeneratorType
+
 from banksheets.entry import DataEntry
-from banksheets.ui.common import convert_csv_data_to_dataentry
+from banksheets.profiling import disable_profiling, enable_profiling
+from banksheets.sql_commands import create_sql_connection, record_source_files
+from banksheets.ui.common import (
+    convert_csv_data_to_dataentry,
+    get_data,
+    iter_data,
+    iter_dataentries,
+    iter_sources,
+    plan_sources,
+)
 
 
 def test_convert_csv_data_to_dataentry_none():
@@ -27,3 +41,104 @@ def test_convert_csv_data_to_dataentry_multiple(
     assert len(input_arr) == len(result)
     for expected, result in zip(input_arr, result):
         assert DataEntry(**expected) == result
+
+
+def test_iter_dataentries_is_lazy(transaction_a, transaction_b):
+    bad = dict(transaction_a, date="2023-01-01")
+    result = iter_dataentries(iter([transaction_a, bad, transaction_b]))
+    assert isinstance(result, GeneratorType)
+    assert list(result) == [
+        DataEntry(**transaction_a),
+        None,
+        DataEntry(**transaction_b),
+    ]
+
+
+def test_iter_data_file(bofa_cc_test_file):
+    source = bofa_cc_test_file
+    result = iter_data(source)
+    assert isinstance(result, GeneratorType)
+    assert list(result) == get_data(source)
+
+
+def test_iter_data_folder(bofa_cc_test_file):
+    result = list(iter_data(bofa_cc_test_file.parent))
+    assert len(result) == 10
+
+
+def test_iter_data_folder_parallel(bofa_cc_test_file):
+    expected = list(iter_data(bofa_cc_test_file.parent))
+    result = list(iter_data(bofa_cc_test_file.parent, jobs=2))
+    assert expected == result
+
+
+def test_iter_data_parallel_profiled(tmp_path, bofa_cc_test_file):
+    for file in bofa_cc_test_file.parent.glob("*.csv"):
+        shutil.copy(file, tmp_path)
+    (tmp_path / "notes.csv").write_text("not,a,statement\n")
+    headers = []
+    try:
+        for jobs in (1, 2):
+            profiler = enable_profiling()
+            list(iter_data(tmp_path, jobs=jobs))
+            stats = profiler.stages["headers"]
+            headers.append((stats.calls, stats.rows, stats.rejected))
+    finally:
+        disable_profiling()
+    assert headers == [(4, 2, 2), (4, 2, 2)]
+
+
+def test_plan_sources(tmp_path, bofa_cc_test_file):
+    statement = tmp_path / "statement.csv"
+    shutil.copy(bofa_cc_test_file, statement)
+    with create_sql_connection(":memory:") as db:
+        planned = plan_sources(tmp_path, db)
+        assert [source.start for source in planned] == [0]
+        assert len(list(iter_sources(planned))) == 5
+        record_source_files(db, [source.source_file for source in planned])
+
+        assert plan_sources(tmp_path, db) == []
+        assert len(plan_sources(tmp_path, db, reimport=True)) == 1
+
+        size = statement.stat().st_size
+        with open(statement, "a") as f:
+            f.write('06/01/2023,1,"Company F","City6, Street F",-1.00\n')
+        planned = plan_sources(tmp_path, db)
+        assert [source.start for source in planned] == [size]
+        assert [entry.description for entry in iter_sources(planned)] == ["Company F"]
+        record_source_files(db, [source.source_file for source in planned])
+
+        statement.write_text(statement.read_text().replace("Company A", "Company Z"))
+        os.utime(statement, ns=(0, 0))
+        planned = plan_sources(tmp_path, db)
+        assert [source.start for source in planned] == [0]
+        assert len(list(iter_sources(planned))) == 6
+
+
+def test_iter_sources_parsed(tmp_path, bofa_cc_test_file):
+    shutil.copy(bofa_cc_test_file, tmp_path / "good.csv")
+    (tmp_path / "bad.csv").write_text("no,header\n01/01/2023,1\n")
+    with create_sql_connection(":memory:") as db:
+        planned = plan_sources(tmp_path, db)
+        for jobs in (1, 2):
+            parsed = []
+            assert len(list(iter_sources(planned, jobs, parsed=parsed))) == 5
+            assert [Path(source.path).name for source in parsed] == ["good.csv"]
+
+
+def test_iter_sources_stops_at_planned_offset(tmp_path, bofa_cc_test_file):
+    statement = tmp_path / "statement.csv"
+    shutil.copy(bofa_cc_test_file, statement)
+    with create_sql_connection(":memory:") as db:
+        planned = plan_sources(tmp_path, db)
+        size = statement.stat().st_size
+        with open(statement, "a") as f:
+            f.write('06/01/2023,1,"Company F","City6, Street F",-1.00\n')
+        parsed = []
+        assert len(list(iter_sources(planned, parsed=parsed))) == 5
+        assert [source.row_offset for source in parsed] == [size]
+        record_source_files(db, parsed)
+
+        planned = plan_sources(tmp_path, db)
+        assert [source.start for source in planned] == [size]
+        assert [entry.description for entry in iter_sources(planned)] == ["Company F"]